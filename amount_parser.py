@@ -0,0 +1,221 @@
+# amount_parser.py
+"""
+金额解析：单遍扫描的手写状态机，不生成中间字符串。
+
+支持：
+  - 阿拉伯数字（含千分位逗号、空格、全角数字/小数点）：500000 / 12,345.67 / 500 000 / ５０万
+  - 阿拉伯数字 + 中文单位链：50万 / 3.5万 / 2亿 / 1万2千3百50
+  - 中文数字（含大写）：五十万 / 一亿二千万 / 三点五万 / 壹仟零伍拾
+  - 口语省略：一万五 = 15000、三千五 = 3500（仅汉字数字；阿拉伯数字“1万5”仍按 10005）
+  - 拉丁后缀：1.2k / $5m / 3w（k=千，w=万，m=百万；须紧跟数字，后面不能紧跟字母）
+
+货币符号、币种文字（$ / 美金 / USD）等其余字符直接跳过；以下视为非法（而不是把数字拼在一起）：
+负号、夹在数字之间的其他字母（1e5 / 1x5）、数字之间的空格后不是恰好三位数字（5000 10000）、
+没有任何数字的纯单位（万）、前面没有数字的万 / 亿 / 百 / 千（万5 / 1亿万 / 千5）、
+同一节内重复的万 / 亿（1万5万）、拉丁后缀之后的数字、单位或第二个后缀（1k5 / 5k万 / 1k2k）。
+科学计数法等 Decimal 直接可解析的写法由调用方先行处理（见 main._parse_amount_any）。
+带单位或后缀的结果量化到 4 位小数（ROUND_HALF_UP），纯数字原样返回。
+
+parse_amounts 在此基础上解析金额列表与区间（批量报价）：
+  - 列表：1万, 5万, 10万 / 1万、5万、10万 / 10000;50000 / 1万 5万 10万（空格分隔，见下）
+  - 区间：1万~5万（步长默认等于起点）/ 1万-10万/2万 / 1万 到 10万 步长 3万
+"""
+import re
+from decimal import Decimal, ROUND_HALF_UP
+
+MAX_AMOUNT = Decimal("1000000000")
+_QUANT = Decimal("0.0001")
+_MAX_DIGITS = 40  # 超长数字串直接拒绝，避免无意义的大整数运算
+# 列表分隔符：顿号、全角逗号、分号，以及不像千分位的半角逗号（后面跟空白，或不是恰好三位数字）
+_RE_LIST_SEP = re.compile(r"\s*(?:[、，;；]|,(?=\s)|,(?!\d{3}(?!\d)))\s*")
+# 区间：起点 ~ 终点 [/ 步长]；起点须非空，“-5”仍按负数拒绝
+_RE_RANGE = re.compile(r"^(.+?)\s*(?:~|～|-|—|至|到)\s*(.+?)(?:\s*(?:/|步长|每)\s*(.+))?$")
+
+# 字符表：字符 -> (类别, 值)；不在表中的字符直接跳过（千分位、空格、货币符号、币种文字等）
+_DIGIT, _CN_DIGIT, _SMALL, _BIG, _SUFFIX, _DOT, _NEG = range(7)
+_CHARS = {}
+for _i, _c in enumerate("0123456789"):
+    _CHARS[_c] = (_DIGIT, _i)
+for _i, _c in enumerate("０１２３４５６７８９"):
+    _CHARS[_c] = (_DIGIT, _i)
+for _c, _i in {
+    "零": 0, "〇": 0, "一": 1, "壹": 1, "二": 2, "两": 2, "贰": 2, "三": 3, "叁": 3,
+    "四": 4, "肆": 4, "五": 5, "伍": 5, "六": 6, "陆": 6, "七": 7, "柒": 7,
+    "八": 8, "捌": 8, "九": 9, "玖": 9,
+}.items():
+    _CHARS[_c] = (_CN_DIGIT, _i)
+# 单位 -> 10 的幂：小单位作用于当前数字，万收拢万以下，亿收拢亿以下
+for _c, _i in {"十": 1, "拾": 1, "百": 2, "佰": 2, "千": 3, "仟": 3}.items():
+    _CHARS[_c] = (_SMALL, _i)
+for _c, _i in {"万": 4, "萬": 4, "亿": 8, "億": 8}.items():
+    _CHARS[_c] = (_BIG, _i)
+for _c, _i in {"k": 3, "K": 3, "w": 4, "W": 4, "m": 6, "M": 6}.items():
+    _CHARS[_c] = (_SUFFIX, _i)
+for _c in (".", "．", "点"):
+    _CHARS[_c] = (_DOT, 0)
+for _c in ("-", "−", "负"):
+    _CHARS[_c] = (_NEG, 0)
+del _c, _i
+
+
+def parse_amount(text: str, limit: Decimal = MAX_AMOUNT) -> Decimal | None:
+    """解析金额；非法、非正或超过 limit 返回 None"""
+    if not text:
+        return None
+    high = mid = section = 0  # 亿及以上 / 万级 / 万以下的已定部分（int，出现小数后为 Decimal）
+    mant = ndig = 0           # 当前数字：整数尾数与位数
+    frac = 0                  # 当前数字的小数位数
+    has_dot = seen = scaled = False  # seen：出现过数字（含“十”）；scaled：出现过单位 / 后缀
+    suffixed = False          # 出现过拉丁后缀：其后不能再接数字 / 单位 / 后缀
+    last_unit = None          # 紧邻的上一个单位的幂（用于口语省略）
+    colloquial = None         # 当前数字若是紧跟单位的单个汉字数字，记录该单位的幂
+    gap = None                # 数字串中被跳过的字符："alpha"（字母）/ "space"（空白）
+
+    n = len(text)
+    for i, ch in enumerate(text):
+        entry = _CHARS.get(ch)
+        if entry is None:
+            if ndig and gap != "alpha":
+                if ch.isascii() and ch.isalpha():
+                    gap = "alpha"
+                elif ch.isspace():
+                    gap = "space"
+            continue
+        kind, val = entry
+        if suffixed:
+            return None  # 拉丁后缀收拢了全部数值，其后再接数字 / 单位 / 后缀（1k5 / 5k万 / 1k2k）不是合法写法
+        if kind <= _CN_DIGIT:
+            if ndig >= _MAX_DIGITS:
+                return None
+            if gap is not None and ndig:
+                # 数字串被字母（1e5）或非千分位的空格（5000 10000）隔开：跳过会把两段数字拼成一个数
+                if gap == "alpha" or kind != _DIGIT or _digit_run(text, i) != 3:
+                    return None
+            gap = None
+            colloquial = last_unit if ndig == 0 and val and kind == _CN_DIGIT else None
+            last_unit = None
+            mant = mant * 10 + val
+            ndig += 1
+            if has_dot:
+                frac += 1
+            seen = True
+            continue
+        gap = None
+        if kind == _SMALL:
+            # 百 / 千前面必须有数字（千5 / 一万百 不是金额）；“十”可省略“一”（十五），“零十”按一十处理
+            if val > 1 and not ndig:
+                return None
+            section += _scaled(mant, val - frac) if mant else 10 ** val
+            if val == 1:
+                seen = True  # “十”本身即是数字（十五 / 十万）
+        elif kind == _BIG:
+            # 同一节内重复的万 / 亿（1万5万、1亿2亿）不是合法的单位链，拒绝而不是求和
+            if (mid if val == 4 else high):
+                return None
+            # 前面没有待收拢的数字（万5 / 1亿万）：不按“一万”补齐，拒绝
+            if not (ndig or section or (val == 8 and mid)):
+                return None
+            cur = _scaled(mant, -frac) if ndig else 0
+            if val == 4:
+                mid += _scaled(section + cur, val)
+            else:
+                high += _scaled(mid + section + cur, val)
+                mid = 0
+            section = 0
+        elif kind == _SUFFIX:
+            # 拉丁后缀须紧跟数字，作用于前面的全部数值（1.2k / $5m）；
+            # 与数字隔开（100 m）或后面紧跟字母时视为普通单词跳过
+            if not (i and _is_digit(text[i - 1])) or (i + 1 < n and text[i + 1].isascii() and text[i + 1].isalpha()):
+                continue
+            cur = _scaled(mant, -frac) if ndig else 0
+            high = _scaled(high + mid + section + cur, val)
+            mid = section = 0
+            val = None
+            suffixed = True
+        elif kind == _DOT:
+            if has_dot:
+                return None  # 第二个小数点
+            has_dot = True
+            last_unit = colloquial = None
+            continue
+        else:
+            return None  # 负数
+        # 单位 / 后缀已收拢当前数字
+        mant = ndig = frac = 0
+        has_dot = False
+        last_unit, colloquial = val, None
+        scaled = True
+
+    if not seen:
+        return None
+    if ndig:
+        if colloquial is not None and colloquial >= 2:
+            section += _scaled(mant, colloquial - 1)  # 一万五 -> 5 * 10^3
+        else:
+            section += _scaled(mant, -frac)
+    total = high + mid + section
+    if isinstance(total, int):
+        if total <= 0 or total > limit:
+            return None
+        return Decimal(total)
+    if scaled:
+        # 带单位的小数金额：保留 4 位小数
+        total = total.quantize(_QUANT, rounding=ROUND_HALF_UP)
+    if total <= 0 or total > limit:
+        return None
+    return total
+
+
+def _is_digit(ch: str) -> bool:
+    entry = _CHARS.get(ch)
+    return entry is not None and entry[0] <= _CN_DIGIT
+
+
+def _digit_run(text: str, start: int) -> int:
+    """从 start 起连续阿拉伯数字（含全角）的个数"""
+    end = start
+    while end < len(text) and _CHARS.get(text[end], (None,))[0] == _DIGIT:
+        end += 1
+    return end - start
+
+
+def _scaled(value, exp: int):
+    """value * 10^exp；exp 为负时转 Decimal，保持精确"""
+    if exp >= 0:
+        return value * 10 ** exp
+    return Decimal(value).scaleb(exp)
+
+
+def parse_amounts(text: str, parse=parse_amount, max_count: int = 20) -> list[Decimal] | None:
+    """
+    解析金额列表 / 区间，逐项交给 parse（默认 parse_amount）；任一项非法返回 None。
+    空格：整段能作为一个金额解析时保持原样（1万 2千、500 000），否则按空格拆开逐个解析（1万 5万 10万）。
+    结果超过 max_count 项时截断为 max_count + 1 项，由调用方据此提示，避免展开超大区间。
+    """
+    amounts = []
+    for part in _RE_LIST_SEP.split(text.strip()):
+        if not part:
+            continue
+        # 先认区间：parse_amount 会跳过“~ / 到”等字符，整体解析会把两端拼成一个数
+        m = _RE_RANGE.match(part)
+        if m is None:
+            value = parse(part)
+            if value is not None:
+                amounts.append(value)
+            else:
+                values = [parse(token) for token in part.split()]
+                if len(values) < 2 or None in values:
+                    return None
+                amounts.extend(values)
+        else:
+            start, end = parse(m.group(1)), parse(m.group(2))
+            step = parse(m.group(3)) if m.group(3) else start
+            if start is None or end is None or step is None or end < start:
+                return None
+            value = start
+            while value <= end and len(amounts) <= max_count:
+                amounts.append(value)
+                value += step
+        if len(amounts) > max_count:
+            return amounts[:max_count + 1]
+    return amounts or None
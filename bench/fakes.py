@@ -0,0 +1,151 @@
+# bench/fakes.py
+"""
+离线替身：不访问 Telegram / boc.cn。
+
+- FakeBotRequest：python-telegram-bot 的请求层替身，进程内直接返回 Bot API 的成功响应
+- LocalHTTPServer：极简 asyncio HTTP/1.1 服务器（keep-alive），供下面两个替身使用
+- fake_bot_api / fake_boc_page：本地 Bot API 与 boc.cn 牌价页替身（可注入延迟）
+- make_update：构造 webhook 推送的 Update JSON
+"""
+import asyncio
+import itertools
+import json
+import random
+import time
+from urllib.parse import parse_qsl
+
+from telegram.request import BaseRequest, RequestData
+
+BOT_USER = {"id": 100000001, "is_bot": True, "first_name": "BOC FX", "username": "boc_fx_bench_bot"}
+
+_ids = itertools.count(1)
+
+
+def bot_api_result(endpoint: str, params: dict):
+    """按 Bot API 方法名返回 result 字段"""
+    if endpoint == "getMe":
+        return BOT_USER
+    if endpoint == "sendMessage":
+        return {
+            "message_id": next(_ids),
+            "date": int(time.time()),
+            "chat": {"id": int(params.get("chat_id", 0)), "type": "private"},
+            "from": BOT_USER,
+            "text": params.get("text", ""),
+        }
+    if endpoint == "getWebhookInfo":
+        return {"url": "", "has_custom_certificate": False, "pending_update_count": 0}
+    return True
+
+
+class FakeBotRequest(BaseRequest):
+    """把所有 Bot API 调用就地应答，并记录调用次数"""
+
+    def __init__(self):
+        self.calls = {}
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_request(self, url: str, method: str, request_data: RequestData | None = None,
+                         read_timeout=None, write_timeout=None, connect_timeout=None,
+                         pool_timeout=None) -> tuple[int, bytes]:
+        endpoint = url.rsplit("/", 1)[-1]
+        self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+        params = request_data.parameters if request_data is not None else {}
+        body = {"ok": True, "result": bot_api_result(endpoint, params)}
+        return 200, json.dumps(body).encode()
+
+
+def make_update(update_id: int, chat_id: int, text: str) -> dict:
+    """webhook 推送的消息更新；以 / 开头的文本带 bot_command 实体"""
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": chat_id, "type": "private"},
+        "from": {"id": chat_id, "is_bot": False, "first_name": "bench"},
+        "text": text,
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": update_id, "message": message}
+
+
+# ---------- 本地 HTTP 替身 ----------
+class LocalHTTPServer:
+    """async handler(method, path, headers, body) -> (status, content_type, body_bytes)"""
+
+    def __init__(self, handler):
+        self._handler = handler
+        self._server = None
+        self._writers = set()
+        self.url = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._server = await asyncio.start_server(self._serve, host, port)
+        self.url = f"http://{host}:{self._server.sockets[0].getsockname()[1]}"
+        return self.url
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            # 3.11 的 Server.close() 不会断开已建立的 keep-alive 连接
+            for writer in list(self._writers):
+                writer.close()
+            await self._server.wait_closed()
+
+    async def _serve(self, reader, writer):
+        self._writers.add(writer)
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                lines = head.decode("latin-1").split("\r\n")
+                method, path, _ = lines[0].split(" ", 2)
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        k, v = line.split(":", 1)
+                        headers[k.strip().lower()] = v.strip()
+                body = await reader.readexactly(int(headers.get("content-length", "0")))
+                status, ctype, payload = await self._handler(method, path, headers, body)
+                writer.write(
+                    f"HTTP/1.1 {status} OK\r\nContent-Type: {ctype}\r\n"
+                    f"Content-Length: {len(payload)}\r\n\r\n".encode("latin-1") + payload
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        except asyncio.CancelledError:
+            # 事件循环退出时取消残留连接，无需向上传播
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+
+def fake_bot_api(stats: dict) -> LocalHTTPServer:
+    """本地 Bot API：/bot<token>/<method>，按方法计数到 stats"""
+    async def handler(method, path, headers, body):
+        endpoint = path.rsplit("/", 1)[-1].split("?", 1)[0]
+        stats[endpoint] = stats.get(endpoint, 0) + 1
+        ctype = headers.get("content-type", "")
+        if "json" in ctype:
+            params = json.loads(body or b"{}")
+        else:
+            params = dict(parse_qsl(body.decode("utf-8")))
+        payload = json.dumps({"ok": True, "result": bot_api_result(endpoint, params)}).encode()
+        return 200, "application/json", payload
+    return LocalHTTPServer(handler)
+
+
+def fake_boc_page(page: bytes, latency: float = 0.0, jitter: float = 0.0) -> LocalHTTPServer:
+    """本地牌价页：每次响应前等待 latency ± jitter 秒"""
+    async def handler(method, path, headers, body):
+        delay = latency + random.uniform(-jitter, jitter) if jitter else latency
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return 200, "text/html; charset=utf-8", page
+    return LocalHTTPServer(handler)
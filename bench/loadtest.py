@@ -0,0 +1,172 @@
+# bench/loadtest.py
+"""
+离线压测：本地 Bot API 替身 + 本地牌价页替身 + uvicorn 子进程，向 /webhook/{token} 发送合成更新。
+
+    python -m bench.loadtest --rate 200 --concurrency 50 --duration 30 --chats 500 --boc-latency 0.3
+    python -m bench.loadtest --target http://127.0.0.1:8000 --token 123:abc   # 压已启动的实例
+
+每个合成会话循环发送：/rate → 兑换 50万 → 费率回复 2.3。
+报告 webhook 吞吐、p50/p95/p99 延迟、错误数，以及 Bot API 收到的 sendMessage 数（真实回复量）。
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import subprocess
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+import httpx
+
+from bench.fakes import fake_boc_page, fake_bot_api, make_update
+
+BENCH_DIR = Path(__file__).resolve().parent
+REPO_DIR = BENCH_DIR.parent
+FIXTURE = BENCH_DIR / "fixtures" / "boc_whpj.html"
+SCRIPT = ["/rate", "兑换 50万", "2.3"]
+
+
+def _percentile(sorted_vals, q):
+    if not sorted_vals:
+        return float("nan")
+    return sorted_vals[min(int(q * len(sorted_vals)), len(sorted_vals) - 1)]
+
+
+async def _wait_ready(url: str, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"服务未就绪：{url}")
+
+
+def _start_app(port: int, token: str, bot_api_url: str, boc_url: str, workers: int) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        "TELEGRAM_TOKEN": token,
+        "TELEGRAM_API_URL": bot_api_url,
+        "BOC_URL": boc_url,
+        "RATE_HISTORY_DB": "",
+        "PORT": str(port),
+    })
+    env.pop("BASE_URL", None)  # 不注册 webhook
+    cmd = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+           "--port", str(port), "--log-level", "warning"]
+    if workers > 1:
+        cmd += ["--workers", str(workers)]
+    return subprocess.Popen(cmd, cwd=REPO_DIR, env=env)
+
+
+async def _generate(target: str, token: str, rate: float, concurrency: int,
+                    duration: float, chats: int):
+    """开环发压：按 rate 均匀发出请求，在途请求数不超过 concurrency"""
+    url = f"{target.rstrip('/')}/webhook/{token}"
+    sem = asyncio.Semaphore(concurrency)
+    latencies = []
+    statuses = Counter()
+    errors = Counter()
+    chat_step = [0] * chats
+    uid = itertools.count(1)
+    tasks = set()
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        async def fire(payload):
+            try:
+                t = time.perf_counter()
+                r = await client.post(url, json=payload)
+                latencies.append(time.perf_counter() - t)
+                statuses[r.status_code] += 1
+            except httpx.HTTPError as e:
+                errors[type(e).__name__] += 1
+            finally:
+                sem.release()
+
+        start = time.perf_counter()
+        interval = 1.0 / rate
+        n = 0
+        while (now := time.perf_counter() - start) < duration:
+            due = n * interval
+            if due > now:
+                await asyncio.sleep(due - now)
+            await sem.acquire()
+            chat = n % chats
+            text = SCRIPT[chat_step[chat] % len(SCRIPT)]
+            chat_step[chat] += 1
+            task = asyncio.create_task(fire(make_update(next(uid), 10_000 + chat, text)))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            n += 1
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+    return n, elapsed, sorted(latencies), statuses, errors
+
+
+async def run(args) -> int:
+    bot_calls = Counter()
+    servers = []
+    proc = None
+    target, token = args.target, args.token
+    try:
+        if target is None:
+            bot_api = fake_bot_api(bot_calls)
+            boc = fake_boc_page(FIXTURE.read_bytes(), args.boc_latency, args.boc_jitter)
+            servers = [bot_api, boc]
+            bot_api_url = await bot_api.start()
+            boc_url = await boc.start() + "/sourcedb/whpj/"
+            target = f"http://127.0.0.1:{args.port}"
+            proc = _start_app(args.port, token, bot_api_url, boc_url, args.workers)
+            await _wait_ready(target + "/")
+
+        sent, elapsed, lat, statuses, errors = await _generate(
+            target, token, args.rate, args.concurrency, args.duration, args.chats)
+        # 等待尾部更新处理完、回复发出
+        await asyncio.sleep(args.drain)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        for server in servers:
+            await server.close()
+
+    ok = statuses.get(200, 0)
+    print(f"发送：{sent} 条 / {elapsed:.1f}s，吞吐 {sent / elapsed:.1f} req/s（成功 {ok}）")
+    print(f"webhook 延迟 ms：p50 {_percentile(lat, 0.50) * 1000:.2f}  "
+          f"p95 {_percentile(lat, 0.95) * 1000:.2f}  p99 {_percentile(lat, 0.99) * 1000:.2f}  "
+          f"max {(lat[-1] if lat else float('nan')) * 1000:.2f}")
+    print("状态码：", dict(statuses))
+    if errors:
+        print("错误：", dict(errors))
+    if bot_calls:
+        print(f"Bot API 调用：{dict(bot_calls)}（sendMessage {bot_calls.get('sendMessage', 0) / elapsed:.1f}/s）")
+    return 0 if not errors and ok == sent else 1
+
+
+def main_cli(argv=None) -> int:
+    p = argparse.ArgumentParser(description="离线压测 webhook")
+    p.add_argument("--rate", type=float, default=100, help="每秒发送的更新数")
+    p.add_argument("--concurrency", type=int, default=50, help="最大在途请求数")
+    p.add_argument("--duration", type=float, default=10, help="发压时长（秒）")
+    p.add_argument("--chats", type=int, default=200, help="合成会话数")
+    p.add_argument("--boc-latency", type=float, default=0.2, help="牌价页替身响应延迟（秒）")
+    p.add_argument("--boc-jitter", type=float, default=0.0, help="延迟抖动（秒）")
+    p.add_argument("--drain", type=float, default=2.0, help="发压结束后等待处理完成的时间（秒）")
+    p.add_argument("--port", type=int, default=18080, help="被测服务端口（自启动时）")
+    p.add_argument("--workers", type=int, default=1, help="uvicorn worker 数（>1 时请配合 STATE_BACKEND=sqlite）")
+    p.add_argument("--target", default=None, help="压已启动的实例，如 http://127.0.0.1:8000")
+    p.add_argument("--token", default="123456:LOADTEST", help="webhook 路径中的 token")
+    return asyncio.run(run(p.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,563 @@
+# bench/run.py
+"""
+离线基准测试（不访问网络）。
+
+    python -m bench.run                    # 运行并与 bench/baseline.json 比较
+    python -m bench.run -k parse           # 只运行名字包含 parse 的项
+    python -m bench.run --update-baseline  # 以本次结果覆盖基线
+
+每项取多轮中最快一轮的单次耗时；超过基线 (1 + threshold) 倍视为退化，退出码 1。
+"""
+import argparse
+import asyncio
+import json
+import platform
+import re
+import ssl
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from decimal import ROUND_HALF_UP, Decimal
+from pathlib import Path
+
+import certifi
+import httpx
+from telegram import Update
+from telegram.ext import Application, CommandHandler, MessageHandler, filters
+
+import main
+from bench.fakes import FakeBotRequest, make_update
+from boc_parser import parse_snapshot
+from quote_engine import quote_ratios
+
+BENCH_DIR = Path(__file__).resolve().parent
+REPO_DIR = BENCH_DIR.parent
+FIXTURES = BENCH_DIR / "fixtures"
+BASELINE = BENCH_DIR / "baseline.json"
+REPEAT = 5
+
+_BENCHES = {}
+
+
+def bench(name: str):
+    """登记同步基准：被装饰函数完成准备工作并返回无参的被测函数"""
+    def deco(fn):
+        _BENCHES[name] = ("sync", fn)
+        return fn
+    return deco
+
+
+def abench(name: str):
+    """登记异步基准：被装饰函数为 async，返回 (单次耗时秒列表)"""
+    def deco(fn):
+        _BENCHES[name] = ("async", fn)
+        return fn
+    return deco
+
+
+def fixture_pages() -> dict[str, str]:
+    return {p.stem: p.read_text(encoding="utf-8") for p in sorted(FIXTURES.glob("*.html"))}
+
+
+# ---------- 金额解析 ----------
+AMOUNT_SAMPLES = ["500000", "12,345.67", "50万", "3.5万", "2亿", "1万2千3百50", "50万美金", "abc"]
+AMOUNT_SAMPLES_EXTENDED = ["五十万", "一亿二千万", "三点五万", "一万五", "$5m", "1.2k", "3w", "壹仟零伍拾"]
+
+
+@bench("parse_amount_any")
+def _():
+    parse = main._parse_amount_any
+    return lambda: [parse(t) for t in AMOUNT_SAMPLES]
+
+
+@bench("parse_amount_extended")
+def _():
+    parse = main._parse_amount_any
+    return lambda: [parse(t) for t in AMOUNT_SAMPLES_EXTENDED]
+
+
+# 改用单遍扫描（amount_parser）之前的正则实现（仅用于对比）
+_RE_AMOUNT_NOISE = re.compile(r"[^0-9\.\,亿万千百十]")
+_RE_PLAIN_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+_RE_AMOUNT_PART = re.compile(r"(\d+(?:\.\d+)?)([亿万千百十]?)")
+_UNIT_MAP = {"亿": Decimal("100000000"), "万": Decimal("10000"),
+             "千": Decimal("1000"), "百": Decimal("100"), "十": Decimal("10"), "": Decimal("1")}
+
+
+def _legacy_parse_amount_chinese(text: str) -> Decimal | None:
+    if not text:
+        return None
+    cleaned = _RE_AMOUNT_NOISE.sub("", text)
+    if not cleaned:
+        return None
+    try:
+        pure = cleaned.replace(",", "")
+        if _RE_PLAIN_NUMBER.fullmatch(pure):
+            val = Decimal(pure)
+            return val if Decimal("0") < val <= Decimal("1000000000") else None
+    except Exception:
+        pass
+    parts = _RE_AMOUNT_PART.findall(cleaned)
+    if not parts:
+        return None
+    total = Decimal("0")
+    try:
+        for num_str, unit in parts:
+            total += Decimal(num_str) * _UNIT_MAP.get(unit, Decimal("1"))
+    except Exception:
+        return None
+    if total <= 0 or total > Decimal("1000000000"):
+        return None
+    return total.quantize(Decimal("0.0001"), rounding=ROUND_HALF_UP)
+
+
+def legacy_parse_amount_any(text: str) -> Decimal | None:
+    val = main._parse_amount_to_decimal(text)
+    if val is not None:
+        return val
+    return _legacy_parse_amount_chinese(text)
+
+
+@bench("parse_amount_any_legacy")
+def _():
+    return lambda: [legacy_parse_amount_any(t) for t in AMOUNT_SAMPLES]
+
+
+# ---------- 报价计算 ----------
+QUOTE_CASES = [(Decimal("500000"), Decimal("2.3")), (Decimal("12345.67"), Decimal("0")),
+               (Decimal("1000000000"), Decimal("100"))]
+QUOTE_PER_UNIT = Decimal("7.1445")
+
+
+@bench("compute_quote")
+def _():
+    quote = main.quote_units
+    return lambda: [quote(a, QUOTE_PER_UNIT, f) for a, f in QUOTE_CASES]
+
+
+@bench("compute_quote_ratios")
+def _():
+    """牌价 / 费率预先转换为分数（批量换算时的情形）"""
+    quote = quote_ratios
+    per_unit = QUOTE_PER_UNIT.as_integer_ratio()
+    cases = [(a.as_integer_ratio(), f.as_integer_ratio()) for a, f in QUOTE_CASES]
+    return lambda: [quote(a, per_unit, f) for a, f in cases]
+
+
+@bench("quote_reply_format")
+def _():
+    """计算 + 格式化六个数值（handle_text 的热路径）"""
+    quote, fmt = main.quote_units, main.fmt_units
+    return lambda: [[fmt(v) for v in quote(a, QUOTE_PER_UNIT, f)] for a, f in QUOTE_CASES]
+
+
+@bench("convert_batch_table")
+def _():
+    """批量兑换（兑换 1万~20万/1万）：一次 quote_batch + 整表格式化"""
+    amounts = main.parse_amounts("1万~20万/1万")
+    return lambda: main._format_batch_quote(amounts, QUOTE_PER_UNIT, Decimal("2.3"), "美金", "美元", "2026.10.01 10:30:00")
+
+
+_Q4 = Decimal("0.0001")
+
+
+def legacy_compute_quote(amount, per_unit, fee_pct):
+    """改用 quote_engine 之前的 Decimal 实现（对比基准与一致性校验的参照）"""
+    fx = Decimal(amount)
+    cny_no_fee = (fx * Decimal(per_unit)).quantize(_Q4, rounding=ROUND_HALF_UP)
+    fee_ratio = (Decimal(fee_pct) / Decimal("100"))
+    fee_cny = (cny_no_fee * fee_ratio).quantize(_Q4, rounding=ROUND_HALF_UP)
+    fee_fx = (fee_cny / Decimal(per_unit)).quantize(_Q4, rounding=ROUND_HALF_UP)
+    total_cny = (cny_no_fee + fee_cny).quantize(_Q4, rounding=ROUND_HALF_UP)
+    total_fx = (fx + fee_fx).quantize(_Q4, rounding=ROUND_HALF_UP)
+    total_rate = (total_cny / fx).quantize(_Q4, rounding=ROUND_HALF_UP)
+    return cny_no_fee, fee_cny, fee_fx, total_cny, total_fx, total_rate
+
+
+@bench("compute_quote_decimal_legacy")
+def _():
+    return lambda: [legacy_compute_quote(a, QUOTE_PER_UNIT, f) for a, f in QUOTE_CASES]
+
+
+@bench("quote_reply_format_legacy")
+def _():
+    fmt = main._fmt_money
+    return lambda: [[fmt(v) for v in legacy_compute_quote(a, QUOTE_PER_UNIT, f)] for a, f in QUOTE_CASES]
+
+
+# ---------- 牌价页解析 ----------
+@bench("parse_boc_page_lxml")
+def _():
+    pages = list(fixture_pages().values())
+    return lambda: [parse_snapshot(p) for p in pages]
+
+
+def _legacy_bs4_parse(text: str):
+    """改用 lxml 之前的 BeautifulSoup 解析路径（仅用于对比）"""
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(text, "lxml")
+    for table in soup.find_all("table"):
+        header_tr = table.find("tr")
+        if not header_tr:
+            continue
+        ths = [th.get_text(strip=True) for th in header_tr.find_all(["th", "td"])]
+        col_ask = next((i for i, n in enumerate(ths) if "现汇卖出" in n), None)
+        if col_ask is None:
+            continue
+        for tr in table.find_all("tr")[1:]:
+            tds = tr.find_all("td")
+            if tds and "美元" in tds[0].get_text(strip=True):
+                return Decimal(tds[col_ask].get_text(strip=True).replace(",", ""))
+    return None
+
+
+try:
+    import bs4  # noqa: F401  可选：未安装时跳过对比项
+except ImportError:
+    pass
+else:
+    @bench("parse_boc_page_bs4_legacy")
+    def _():
+        pages = list(fixture_pages().values())
+        return lambda: [_legacy_bs4_parse(p) for p in pages]
+
+
+# ---------- 消息分发：PTB Regex 过滤器链 vs 单次分类路由 ----------
+ROUTE_SAMPLES = ["/rate", "/rate EUR", "汇率", "汇率 日元 现钞买入", "兑换 50万", "/convert 1000 EUR",
+                 "/history 30d", "2.3", "取消", "今天吃什么", "/start"]
+
+
+def _route_updates():
+    """初始化过的 bot（CommandHandler 需要 bot.username）与样例 Update"""
+    application = (Application.builder().token("123456:BENCH").updater(None)
+                   .request(FakeBotRequest()).get_updates_request(FakeBotRequest()).build())
+    asyncio.run(application.bot.initialize())
+    updates = [Update.de_json(make_update(i, 1000, t), application.bot) for i, t in enumerate(ROUTE_SAMPLES)]
+    return application, updates
+
+
+async def _noop(update, context):
+    pass
+
+
+@bench("route_dispatch_legacy")
+def _():
+    """改造前的 Handler 链：逐个 check_update 直到命中（与 Application.process_update 相同）"""
+    _, updates = _route_updates()
+    handlers = [
+        CommandHandler("rate", _noop),
+        MessageHandler(filters.TEXT & filters.Regex(r"^/?\s*汇率(\s.*)?$"), _noop),
+        CommandHandler("history", _noop),
+        CommandHandler("convert", _noop),
+        MessageHandler(filters.TEXT & filters.Regex(r"^兑换\s*\S+.*$"), _noop),
+        MessageHandler(filters.TEXT & ~filters.COMMAND, _noop),
+    ]
+
+    def op():
+        for u in updates:
+            for h in handlers:
+                if h.check_update(u):
+                    break
+    return op
+
+
+@bench("route_dispatch_router")
+def _():
+    application, updates = _route_updates()
+    handler = MessageHandler(filters.UpdateType.MESSAGE & filters.TEXT, _noop)
+    username = application.bot.username
+    classify, command_length = main._classify_message, main._command_length
+
+    def op():
+        for u in updates:
+            if handler.check_update(u):
+                classify(u.message.text, command_length(u.message), username)
+    return op
+
+
+# ---------- 冷启动：导入 main ----------
+@bench("import_main_cold")
+def _():
+    """新解释器中 import main（含解释器自身启动）；bocfx / lxml 不应在此阶段被导入"""
+    cmd = [sys.executable, "-c", "import main, sys; assert 'bocfx' not in sys.modules and 'lxml' not in sys.modules"]
+    return lambda: subprocess.run(cmd, cwd=REPO_DIR, check=True, stdout=subprocess.DEVNULL)
+
+
+# ---------- 连接池：冷启动 vs 复用 ----------
+# 冷启动的主要开销是 TLS 握手；本地 HTTPS 替身的自签名证书在运行时生成到临时目录，不入库
+_tls_dir = None  # tempfile.TemporaryDirectory，进程退出时删除
+
+
+def _tls_files() -> tuple[Path, Path]:
+    """首次调用时用 openssl 生成 localhost / 127.0.0.1 的自签名证书（EC P-256，有效期 1 天），返回 (cert, key)"""
+    global _tls_dir
+    if _tls_dir is None:
+        tmp = tempfile.TemporaryDirectory(prefix="bocbot-bench-tls-")
+        cert, key = Path(tmp.name) / "cert.pem", Path(tmp.name) / "key.pem"
+        subprocess.run(
+            ["openssl", "req", "-x509", "-newkey", "ec", "-pkeyopt", "ec_paramgen_curve:prime256v1",
+             "-nodes", "-days", "1", "-subj", "/CN=localhost",
+             "-addext", "subjectAltName=DNS:localhost,IP:127.0.0.1",
+             "-keyout", str(key), "-out", str(cert)],
+            check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        _tls_dir = tmp
+    return Path(_tls_dir.name) / "cert.pem", Path(_tls_dir.name) / "key.pem"
+
+
+def _client_tls() -> ssl.SSLContext:
+    """
+    客户端 TLS 上下文：与线上默认的 verify=True 一样加载 certifi 根证书，再额外信任替身证书。
+    冷启动基准每次都新建，计入线上每个新客户端都要付出的加载开销。
+    """
+    ctx = ssl.create_default_context(cafile=certifi.where())
+    ctx.load_verify_locations(cafile=str(_tls_files()[0]))
+    return ctx
+
+
+async def _serve_fixture():
+    """本地 HTTPS（HTTP/1.1 keep-alive）服务器，返回 (server, url)"""
+    body = next(iter(fixture_pages().values())).encode("utf-8")
+    head = (b"HTTP/1.1 200 OK\r\nContent-Type: text/html; charset=utf-8\r\n"
+            b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n")
+    tls = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    tls.load_cert_chain(*_tls_files())
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                req = await reader.readuntil(b"\r\n\r\n")
+                if not req:
+                    break
+                writer.write(head + body)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ssl.SSLError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0, ssl=tls)
+    port = server.sockets[0].getsockname()[1]
+    return server, f"https://127.0.0.1:{port}/sourcedb/whpj/"
+
+
+@abench("fetch_cold_client")
+async def _():
+    # 每次新建客户端：TCP + TLS 握手 + 请求
+    server, url = await _serve_fixture()
+    samples = []
+    async with server:
+        for _ in range(50):
+            t = time.perf_counter()
+            async with httpx.AsyncClient(verify=_client_tls()) as client:
+                await client.get(url)
+            samples.append(time.perf_counter() - t)
+    return samples
+
+
+@abench("fetch_warm_client")
+async def _():
+    # 复用连接池：握手只在预热请求中发生一次
+    server, url = await _serve_fixture()
+    samples = []
+    async with server:
+        async with httpx.AsyncClient(verify=_client_tls()) as client:
+            await client.get(url)
+            for _ in range(50):
+                t = time.perf_counter()
+                await client.get(url)
+                samples.append(time.perf_counter() - t)
+    return samples
+
+
+# ---------- webhook 端到端（Bot API 替身） ----------
+async def _webhook_env():
+    main.TOKEN = "123456:BENCH"
+    main.RATE_TTL = 10 ** 9
+    snapshot = parse_snapshot(next(iter(fixture_pages().values())))
+    per_usd, pub_time, raw_100 = main._usd_from_snapshot(snapshot)
+    main._rate_cache.update(per_usd=per_usd, pub_time=pub_time, raw_100=raw_100,
+                            snapshot=snapshot, cached_at=main._now_tz())
+    application = (Application.builder().token(main.TOKEN).updater(None)
+                   .request(FakeBotRequest()).get_updates_request(FakeBotRequest()).build())
+    main._register_handlers(application)
+    main.ptb_app = application
+    await application.initialize()
+    await main._start_update_workers()
+    transport = httpx.ASGITransport(app=main.app)
+    return application, httpx.AsyncClient(transport=transport, base_url="http://bench")
+
+
+async def _webhook_run(script: list[str], rounds: int = 100):
+    application, client = await _webhook_env()
+    path = f"/webhook/{main.TOKEN}"
+    samples = []
+    uid = 0
+    try:
+        for i in range(rounds):
+            t = time.perf_counter()
+            for text in script:
+                uid += 1
+                await client.post(path, json=make_update(uid, 1000 + i % 50, text))
+            await main._scheduler.join()
+            samples.append(time.perf_counter() - t)
+    finally:
+        await main._stop_update_workers()
+        await client.aclose()
+        await application.shutdown()
+    return samples
+
+
+@abench("webhook_rate")
+async def _():
+    return await _webhook_run(["/rate"])
+
+
+@abench("webhook_convert_flow")
+async def _():
+    return await _webhook_run(["兑换 50万", "2.3"])
+
+
+@abench("webhook_convert_batch")
+async def _():
+    # 五个金额一次报价：对比 webhook_convert_flow 的五倍（逐个兑换需要十条消息）
+    return await _webhook_run(["兑换 1万, 5万, 10万, 20万, 50万", "2.3"])
+
+
+@abench("webhook_group_chatter")
+async def _():
+    # 无会话的群聊闲聊：应在预过滤阶段直接应答
+    return await _webhook_run(["今天吃什么", "哈哈哈", "ok"])
+
+
+# ---------- HTTP JSON API ----------
+async def _api_run(path: str, headers: dict | None = None, rounds: int = 200):
+    application, client = await _webhook_env()
+    samples = []
+    try:
+        for _ in range(rounds):
+            t = time.perf_counter()
+            await client.get(path, headers=headers)
+            samples.append(time.perf_counter() - t)
+    finally:
+        await main._stop_update_workers()
+        await client.aclose()
+        await application.shutdown()
+    return samples
+
+
+@abench("api_rate")
+async def _():
+    # 整表：首个请求序列化，之后返回缓存字节
+    return await _api_run("/api/rate")
+
+
+@abench("api_rate_not_modified")
+async def _():
+    # 轮询客户端带 If-None-Match：304，无响应体
+    main._api_rate_bodies["key"] = None
+    etag = main._rate_api_body("")[1]
+    return await _api_run("/api/rate", {"If-None-Match": etag})
+
+
+@bench("api_rate_body")
+def _():
+    """已缓存：按快照取回字节与 ETag"""
+    snapshot = parse_snapshot(next(iter(fixture_pages().values())))
+    main._rate_cache.update(snapshot=snapshot, per_usd=Decimal("7.1445"), pub_time=snapshot.pub_time)
+    main._rate_api_body("")
+    return lambda: main._rate_api_body("")
+
+
+@bench("api_rate_body_serialize")
+def _():
+    """对照：每次都重新构造并序列化整表（不缓存响应体时的单次开销）"""
+    snapshot = parse_snapshot(next(iter(fixture_pages().values())))
+    main._rate_cache.update(snapshot=snapshot, per_usd=Decimal("7.1445"), pub_time=snapshot.pub_time)
+    bodies = main._api_rate_bodies
+
+    def op():
+        bodies["key"] = None
+        return main._rate_api_body("")
+    return op
+
+
+@abench("api_convert")
+async def _():
+    return await _api_run("/api/convert?amount=1万,5万,10万&fee=2.3")
+
+
+# ---------- 运行 ----------
+def _run_sync(factory) -> float:
+    op = factory()
+    timer = timeit.Timer(op)
+    number, _ = timer.autorange()
+    return min(timer.repeat(REPEAT, number)) / number
+
+
+def _run_async(factory) -> float:
+    best = None
+    for _ in range(REPEAT):
+        samples = asyncio.run(factory())
+        # 去掉首个样本（预热），取中位数作为一轮结果
+        samples = sorted(samples[1:] or samples)
+        med = samples[len(samples) // 2]
+        best = med if best is None else min(best, med)
+    return best
+
+
+def run(names: list[str]) -> dict[str, float]:
+    results = {}
+    for name in names:
+        kind, factory = _BENCHES[name]
+        results[name] = _run_sync(factory) if kind == "sync" else _run_async(factory)
+        print(f"  {name:<28} {results[name] * 1e6:>12.2f} us/op", flush=True)
+    return results
+
+
+def compare(results: dict[str, float], baseline: dict[str, float], threshold: float) -> list[str]:
+    regressions = []
+    print(f"\n{'benchmark':<28} {'baseline us':>12} {'current us':>12} {'ratio':>7}")
+    for name, cur in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:<28} {'-':>12} {cur * 1e6:>12.2f} {'new':>7}")
+            continue
+        ratio = cur / base
+        flag = "  REGRESSION" if ratio > 1 + threshold else ""
+        print(f"{name:<28} {base * 1e6:>12.2f} {cur * 1e6:>12.2f} {ratio:>7.2f}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main_cli(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="离线基准测试")
+    parser.add_argument("-k", dest="filter", default="", help="只运行名字包含该子串的基准")
+    parser.add_argument("--threshold", type=float, default=0.30, help="允许的退化比例（默认 0.30）")
+    parser.add_argument("--update-baseline", action="store_true", help="以本次结果覆盖基线文件")
+    args = parser.parse_args(argv)
+
+    names = [n for n in _BENCHES if args.filter in n]
+    results = run(names)
+
+    if args.update_baseline:
+        data = json.loads(BASELINE.read_text()) if BASELINE.exists() else {}
+        data.setdefault("results", {}).update(results)
+        data["machine"] = f"{platform.python_implementation()} {platform.python_version()} {platform.machine()}"
+        BASELINE.write_text(json.dumps(data, indent=2, sort_keys=True) + "\n")
+        print(f"\n基线已更新：{BASELINE}")
+        return 0
+
+    baseline = json.loads(BASELINE.read_text())["results"] if BASELINE.exists() else {}
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"\n退化（> {args.threshold:.0%}）：{', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
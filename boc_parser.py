@@ -0,0 +1,228 @@
+# boc_parser.py
+"""
+中国银行外汇牌价页面（whpj）解析。
+
+基于 lxml，XPath 预编译；一次解析整张牌价表，得到不可变的多币种快照 RateSnapshot，
+数字直接解析为 Decimal（不经 float）。所有价格均为“每 100 外币”的人民币价。
+
+lxml 在首次解析时才导入（缩短冷启动）；货币/价格类型等常量不依赖 lxml。
+"""
+import time
+from decimal import Decimal, InvalidOperation
+from types import MappingProxyType
+from typing import NamedTuple
+
+# ---------- 预编译选择器（首次解析时加载） ----------
+etree = lxml_html = None
+_XP_TABLES = _XP_ROWS = _XP_HEADER_CELLS = _XP_CELLS = None
+lxml_import_seconds = None  # 首次加载 lxml 与编译 XPath 的耗时；未加载时为 None
+
+
+def _load_lxml() -> None:
+    global etree, lxml_html, _XP_TABLES, _XP_ROWS, _XP_HEADER_CELLS, _XP_CELLS, lxml_import_seconds
+    t0 = time.perf_counter()
+    from lxml import etree as _etree, html as _html
+    _XP_ROWS = _etree.XPath(".//tr")
+    _XP_HEADER_CELLS = _etree.XPath("./th | ./td")
+    _XP_CELLS = _etree.XPath("./td")
+    etree, lxml_html = _etree, _html
+    _XP_TABLES = _etree.XPath("//table")  # 最后赋值：parse_snapshot 以它判断是否已加载
+    lxml_import_seconds = time.perf_counter() - t0
+
+TIME_HEADERS = ("发布时间", "发布日期", "Pub")
+
+# 价格类型 -> 表头关键字（顺序即 RateRow 中价格字段顺序）
+PRICE_TYPES = {
+    "SE_BID": "现汇买入",
+    "BN_BID": "现钞买入",
+    "SE_ASK": "现汇卖出",
+    "BN_ASK": "现钞卖出",
+    "MIDDLE": "中行折算",
+}
+
+# 牌价页中文货币名 -> ISO 4217 代码
+CURRENCY_CODES = {
+    "阿联酋迪拉姆": "AED", "澳大利亚元": "AUD", "巴西里亚尔": "BRL", "加拿大元": "CAD",
+    "瑞士法郎": "CHF", "丹麦克朗": "DKK", "欧元": "EUR", "英镑": "GBP",
+    "港币": "HKD", "印尼卢比": "IDR", "印度卢比": "INR", "日元": "JPY",
+    "韩国元": "KRW", "澳门元": "MOP", "林吉特": "MYR", "挪威克朗": "NOK",
+    "新西兰元": "NZD", "菲律宾比索": "PHP", "卢布": "RUB", "沙特里亚尔": "SAR",
+    "瑞典克朗": "SEK", "新加坡元": "SGD", "泰国铢": "THB", "土耳其里拉": "TRY",
+    "新台币": "TWD", "美元": "USD", "南非兰特": "ZAR", "哈萨克斯坦坚戈": "KZT",
+    "塞尔维亚第纳尔": "RSD", "匈牙利福林": "HUF", "文莱元": "BND", "科威特第纳尔": "KWD",
+    "蒙古图格里克": "MNT", "尼泊尔卢比": "NPR", "巴基斯坦卢比": "PKR", "以色列谢克尔": "ILS",
+}
+CURRENCY_NAMES = {code: name for name, code in CURRENCY_CODES.items()}
+
+# 价格类型展示名
+PRICE_LABELS = {
+    "SE_BID": "现汇买入价（SE,BID）",
+    "BN_BID": "现钞买入价（BN,BID）",
+    "SE_ASK": "现汇卖出价（SE,ASK）",
+    "BN_ASK": "现钞卖出价（BN,ASK）",
+    "MIDDLE": "中行折算价（MIDDLE）",
+}
+
+
+class RateRow(NamedTuple):
+    """单个币种一行牌价（每100外币，人民币）；缺失的价格为 None"""
+    code: str
+    name: str
+    se_bid: Decimal | None
+    bn_bid: Decimal | None
+    se_ask: Decimal | None
+    bn_ask: Decimal | None
+    middle: Decimal | None
+    pub_time: str | None
+
+    def price(self, price_type: str) -> Decimal | None:
+        return self[_PRICE_INDEX[price_type]]
+
+
+_PRICE_INDEX = {pt: RateRow._fields.index(pt.lower()) for pt in PRICE_TYPES}
+
+
+class RateSnapshot:
+    """一次抓取得到的整张牌价表（只读），按币种代码索引"""
+    __slots__ = ("_rows", "pub_time")
+
+    def __init__(self, rows: dict[str, RateRow], pub_time: str | None = None):
+        self._rows = MappingProxyType(dict(rows))
+        self.pub_time = pub_time
+
+    def __reduce__(self):
+        # MappingProxyType 不可 pickle；共享状态后端需要序列化快照
+        return RateSnapshot, (dict(self._rows), self.pub_time)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, code: str) -> bool:
+        return code in self._rows
+
+    def __iter__(self):
+        return iter(self._rows.values())
+
+    def get(self, code: str) -> RateRow | None:
+        return self._rows.get(code)
+
+    def price(self, code: str, price_type: str = "SE_ASK") -> Decimal | None:
+        """返回每100外币的人民币价；币种或价格缺失返回 None"""
+        row = self._rows.get(code)
+        return row.price(price_type) if row is not None else None
+
+
+def _cell_text(el) -> str:
+    """等价于 BeautifulSoup 的 get_text(strip=True)：各文本片段去空白后拼接"""
+    return "".join(t.strip() for t in el.itertext())
+
+
+def parse_decimal(text: str | None) -> Decimal | None:
+    """'1,234.56' -> Decimal('1234.56')；空串/非法/非有限值返回 None"""
+    if not text:
+        return None
+    try:
+        val = Decimal(text.replace(",", "").strip())
+    except InvalidOperation:
+        return None
+    return val if val.is_finite() else None
+
+
+def currency_code(name: str) -> str | None:
+    """牌价页货币名（或已是代码）-> ISO 代码；无法识别返回 None"""
+    name = name.strip()
+    code = CURRENCY_CODES.get(name)
+    if code:
+        return code
+    upper = name.upper()
+    if upper in CURRENCY_NAMES:
+        return upper
+    for cn, code in CURRENCY_CODES.items():
+        if cn in name:
+            return code
+    return None
+
+
+def price_type(text: str) -> str | None:
+    """'现钞买入' / '现钞买入价' / 'BN,BID' / 'bn_bid' -> 'BN_BID'；无法识别返回 None"""
+    t = text.strip().rstrip("价")
+    for pt, key in PRICE_TYPES.items():
+        if t == key:
+            return pt
+    norm = t.upper().replace(",", "_").replace(" ", "_")
+    return norm if norm in PRICE_TYPES else None
+
+
+def _find_columns(header_cells: list[str]) -> tuple[dict[str, int], int | None]:
+    cols = {}
+    col_time = None
+    for i, name in enumerate(header_cells):
+        for pt, key in PRICE_TYPES.items():
+            if key in name and pt not in cols:
+                cols[pt] = i
+        if col_time is None and any(h in name for h in TIME_HEADERS):
+            col_time = i
+    return cols, col_time
+
+
+def _parse_root(page: str | bytes):
+    try:
+        return lxml_html.fromstring(page)
+    except ValueError:
+        # 带 <?xml encoding=...?> 声明的 str 无法直接解析，改用字节
+        if not isinstance(page, str):
+            return None
+        try:
+            return lxml_html.fromstring(page.encode("utf-8"))
+        except (etree.ParserError, ValueError):
+            return None
+    except etree.ParserError:
+        return None
+
+
+def parse_snapshot(page: str | bytes) -> RateSnapshot | None:
+    """
+    解析整张牌价表（第一个含“现汇卖出”列的表格）。
+    同一币种出现多行时保留第一行有效数据；表格缺失返回 None。
+    """
+    if not page:
+        return None
+    if _XP_TABLES is None:
+        _load_lxml()
+    root = _parse_root(page)
+    if root is None:
+        return None
+
+    for table in _XP_TABLES(root):
+        rows = _XP_ROWS(table)
+        if not rows:
+            continue
+        cols, col_time = _find_columns([_cell_text(c) for c in _XP_HEADER_CELLS(rows[0])])
+        if "SE_ASK" not in cols:
+            continue
+
+        records = {}
+        pub_time = None
+        for tr in rows[1:]:
+            cells = [_cell_text(td) for td in _XP_CELLS(tr)]
+            if not cells or not cells[0]:
+                continue
+            code = currency_code(cells[0])
+            if code is None or code in records:
+                continue
+            prices = [
+                parse_decimal(cells[cols[pt]]) if pt in cols and cols[pt] < len(cells) else None
+                for pt in PRICE_TYPES
+            ]
+            if all(p is None for p in prices):
+                continue
+            row_time = None
+            if col_time is not None and col_time < len(cells):
+                row_time = cells[col_time] or None
+            records[code] = RateRow(code, cells[0], *prices, row_time)
+            if pub_time is None and row_time:
+                pub_time = row_time
+        if records:
+            return RateSnapshot(records, pub_time)
+    return None
+
@@ -0,0 +1,85 @@
+# chat_scheduler.py
+"""
+按会话串行、跨会话并发的更新调度。
+
+同一 key（chat_id）的任务严格按提交顺序逐个执行；不同 key 之间并发，
+总并发数受 max_concurrency 限制。
+"""
+import asyncio
+from collections import deque
+
+
+class ChatScheduler:
+    def __init__(self, handler, max_concurrency: int):
+        self._handler = handler                  # async def handler(item)
+        self._sem = asyncio.Semaphore(max(max_concurrency, 1))
+        self._chains = {}                        # key -> deque[item]，仅包含有待处理任务的 key
+        self._tasks = set()
+        self._pending = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self.stats = {"submitted": 0, "processed": 0, "failed": 0}
+
+    @property
+    def pending(self) -> int:
+        """已提交但尚未处理完的任务数"""
+        return self._pending
+
+    @property
+    def active_chats(self) -> int:
+        return len(self._chains)
+
+    def has_pending(self, key) -> bool:
+        """该 key 是否有已提交但尚未处理完的任务"""
+        return key in self._chains
+
+    def submit(self, key, item) -> None:
+        self._pending += 1
+        self._idle.clear()
+        self.stats["submitted"] += 1
+        chain = self._chains.get(key)
+        if chain is not None:
+            chain.append(item)
+            return
+        self._chains[key] = deque((item,))
+        task = asyncio.create_task(self._run(key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, key) -> None:
+        chain = self._chains[key]
+        try:
+            while chain:
+                item = chain.popleft()
+                try:
+                    async with self._sem:
+                        await self._handler(item)
+                    self.stats["processed"] += 1
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.stats["failed"] += 1
+                    print("DEBUG scheduler handler:", e)
+                finally:
+                    self._done_one()
+        finally:
+            # 被取消时丢弃该会话剩余任务
+            self._pending -= len(chain)
+            del self._chains[key]
+            if self._pending == 0:
+                self._idle.set()
+
+    def _done_one(self) -> None:
+        self._pending -= 1
+        if self._pending == 0:
+            self._idle.set()
+
+    async def join(self) -> None:
+        """等待所有已提交任务处理完"""
+        await self._idle.wait()
+
+    async def close(self) -> None:
+        """取消所有进行中的会话任务"""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,111 @@
+# loop_monitor.py
+"""
+事件循环延迟监控与慢回调检测。
+
+- 心跳协程：每 interval 秒 sleep 一次，实际耗时减去 interval 即为事件循环延迟（lag）
+- 看门狗线程：心跳超过 threshold 未更新时，说明有回调正阻塞事件循环线程，
+  立即通过 sys._current_frames() 抓取事件循环线程的调用栈（此时栈顶就是阻塞点）
+
+看门狗只读心跳时间戳，不向事件循环提交任何任务，所以循环被阻塞时仍能工作。
+"""
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime, timezone
+
+
+class LoopMonitor:
+    def __init__(self, interval: float = 0.1, threshold: float = 0.1, keep: int = 20,
+                 observe=None, max_frames: int = 40):
+        self.interval = interval
+        self.threshold = threshold
+        self.max_frames = max_frames
+        self._observe = observe            # 可选：observe(lag_seconds)，如直方图
+        self._events = deque(maxlen=keep)  # 最近的慢回调（含调用栈）
+        self._beat = time.monotonic()
+        self._stall = None                 # 看门狗已抓栈、尚未结束的阻塞
+        self._loop_thread = None
+        self._task = None
+        self._thread = None
+        self._stop = threading.Event()
+        self.stats = {"ticks": 0, "slow_callbacks": 0, "last_lag_ms": 0.0, "max_lag_ms": 0.0}
+
+    def start(self) -> None:
+        """须在事件循环线程内调用"""
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watchdog, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread is not None:
+            await asyncio.to_thread(self._thread.join, 1.0)
+            self._thread = None
+
+    async def _heartbeat(self):
+        interval = self.interval
+        while True:
+            t = time.perf_counter()
+            await asyncio.sleep(interval)
+            lag = max(time.perf_counter() - t - interval, 0.0)
+            self._beat = time.monotonic()
+            st = self.stats
+            st["ticks"] += 1
+            st["last_lag_ms"] = round(lag * 1000, 3)
+            if st["last_lag_ms"] > st["max_lag_ms"]:
+                st["max_lag_ms"] = st["last_lag_ms"]
+            if self._observe is not None:
+                self._observe(lag)
+            if lag >= self.threshold:
+                st["slow_callbacks"] += 1
+                stall, self._stall = self._stall, None
+                if stall is None:
+                    # 阻塞时间短于看门狗轮询间隔，未能抓到栈
+                    stall = self._record(None)
+                stall["blocked_ms"] = round(lag * 1000, 1)
+
+    def _watchdog(self):
+        poll = max(self.threshold / 4, 0.005)
+        captured_for = None
+        while not self._stop.wait(poll):
+            beat = self._beat
+            if beat == captured_for:
+                continue
+            if time.monotonic() - beat > self.interval + self.threshold:
+                captured_for = beat
+                frame = sys._current_frames().get(self._loop_thread)
+                self._stall = self._record(frame)
+
+    def _record(self, frame) -> dict:
+        stack = []
+        if frame is not None:
+            stack = [f"{fs.filename}:{fs.lineno} {fs.name}"
+                     for fs in traceback.extract_stack(frame)[-self.max_frames:]]
+        event = {
+            "at": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "blocked_ms": None,  # 阻塞结束后由心跳补上
+            "stack": stack,
+        }
+        self._events.append(event)
+        return event
+
+    def snapshot(self) -> dict:
+        return {
+            "interval_ms": self.interval * 1000,
+            "threshold_ms": self.threshold * 1000,
+            **self.stats,
+            "recent": list(reversed(self._events)),
+        }
@@ -1,23 +1,63 @@
 # main.py
+import time
+_IMPORT_T0 = time.perf_counter()  # 启动耗时报告：模块导入起点
+
 import os
 import math
-from contextlib import asynccontextmanager
+import re
+import hashlib
+import hmac
+import threading
+from collections import deque
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
 from http import HTTPStatus
 from urllib.parse import quote, unquote
 from datetime import datetime, timedelta, timezone
 from decimal import Decimal, ROUND_HALF_UP, InvalidOperation
 
 from fastapi import FastAPI, Request, Response
-from telegram import Update
+from telegram import MessageEntity, Update
+from telegram.request import HTTPXRequest
 from telegram.ext import (
-    Application, CommandHandler, ContextTypes,
+    Application, ContextTypes,
     MessageHandler, filters
 )
 
-# 第三方依赖
-from bocfx import bocfx
+# 第三方依赖（bocfx 仅在兜底时导入，见 _load_bocfx；lxml 在首次解析牌价页时导入）
 import httpx
-from bs4 import BeautifulSoup
+try:
+    import orjson  # 可选：webhook 请求体解析与 /api/rate 序列化更快；未安装时退回标准库 json
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+except ImportError:
+    import json
+    _json_loads = json.loads
+
+    def _json_dumps(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
+
+from rate_history import CN_TZ, RateHistory
+from state_backend import MemoryBackend, SqliteBackend, StateBackend
+from chat_scheduler import ChatScheduler
+from loop_monitor import LoopMonitor
+import sampling_profiler
+import metrics
+from amount_parser import parse_amount, parse_amounts
+from quote_engine import fmt_units, quote_batch, quote_units, to_decimal
+import boc_parser
+from boc_parser import (
+    CURRENCY_CODES, CURRENCY_NAMES, PRICE_LABELS, PRICE_TYPES, RateSnapshot,
+    currency_code, parse_snapshot, price_type,
+)
+
+# 启动耗时：导入 / lifespan 各步骤 / 延迟导入（/__stats 的 startup）
+_startup = {"import_ms": round((time.perf_counter() - _IMPORT_T0) * 1000, 1),
+            "lifespan_ms": None, "lifespan_steps": {}, "lazy_imports": {}, "webhook": None}
+
+def _ms_since(t0: float) -> float:
+    return round((time.perf_counter() - t0) * 1000, 1)
 
 # ---------- 环境变量 ----------
 def _mask(s: str | None) -> str:
@@ -27,6 +67,8 @@ def _mask(s: str | None) -> str:
 
 TOKEN = os.environ.get("TELEGRAM_TOKEN") or os.environ.get("TOKEN")
 BASE_URL = os.environ.get("BASE_URL")
+# Bot API 地址（压测时可指向本地替身服务器）
+TELEGRAM_API_URL = os.environ.get("TELEGRAM_API_URL", "https://api.telegram.org").rstrip("/")
 PORT = int(os.environ.get("PORT", "8000"))
 
 print("=== Boot ===")
@@ -36,14 +78,98 @@ print("PORT:", PORT)
 print("================")
 
 # ---------- 常量 & 内存状态 ----------
-BOC_URL = "https://www.boc.cn/sourcedb/whpj/"
+BOC_URL = os.environ.get("BOC_URL", "https://www.boc.cn/sourcedb/whpj/")
 RATE_TTL = 120  # 秒
+# 后台预刷新：在缓存过期前 RATE_REFRESH_AHEAD 秒刷新；过期但未超过 RATE_MAX_STALE 时先返回旧值
+RATE_BACKGROUND_REFRESH = os.environ.get("RATE_BACKGROUND_REFRESH", "1").lower() in {"1", "true", "yes"}
+RATE_REFRESH_AHEAD = float(os.environ.get("RATE_REFRESH_AHEAD", "30"))  # 秒
+RATE_REFRESH_RETRY = float(os.environ.get("RATE_REFRESH_RETRY", "10"))  # 秒，刷新失败后重试间隔
+RATE_MAX_STALE = float(os.environ.get("RATE_MAX_STALE", "1800"))  # 秒
 PENDING_TTL = 120  # 秒，等待费率输入超时
+# 会话状态上限：超出容量按 LRU 淘汰；超时会话保留 PENDING_GRACE 秒用于提示“已超时”，之后自动清理
+PENDING_GRACE = float(os.environ.get("PENDING_GRACE", "600"))  # 秒
+PENDING_CAPACITY = int(os.environ.get("PENDING_CAPACITY", "10000"))
+LAST_FEE_TTL = float(os.environ.get("LAST_FEE_TTL", str(30 * 24 * 3600)))  # 秒
+LAST_FEE_CAPACITY = int(os.environ.get("LAST_FEE_CAPACITY", "50000"))
+STATE_SWEEP_INTERVAL = float(os.environ.get("STATE_SWEEP_INTERVAL", "30"))  # 秒
+# 状态后端：memory（单进程）/ sqlite（多 worker、多副本共享 STATE_DB 文件）
+STATE_BACKEND = os.environ.get("STATE_BACKEND", "memory").lower()
+STATE_DB = os.environ.get("STATE_DB", "state.sqlite3")
+# 抓取中行页面用的共享 HTTP 连接池（在 lifespan 中创建/关闭）
+HTTP_MAX_CONNECTIONS = int(os.environ.get("BOC_HTTP_MAX_CONNECTIONS", "10"))
+HTTP_MAX_KEEPALIVE = int(os.environ.get("BOC_HTTP_MAX_KEEPALIVE", "5"))
+HTTP_KEEPALIVE_EXPIRY = float(os.environ.get("BOC_HTTP_KEEPALIVE_EXPIRY", "60"))  # 秒
+HTTP2_ENABLED = os.environ.get("BOC_HTTP2", "").lower() in {"1", "true", "yes"}
+# bocfx 兜底为同步阻塞调用，放到有界线程池执行，每次尝试单独超时
+BOCFX_WORKERS = int(os.environ.get("BOCFX_WORKERS", "2"))
+BOCFX_ATTEMPT_TIMEOUT = float(os.environ.get("BOCFX_ATTEMPT_TIMEOUT", "8"))  # 秒
+# webhook 快速应答：更新先入有界队列再处理；队列满时返回 429
+# 同一 chat 的更新按序串行，不同 chat 并发，总并发上限 UPDATE_WORKERS
+UPDATE_QUEUE_SIZE = int(os.environ.get("UPDATE_QUEUE_SIZE", "1000"))
+UPDATE_WORKERS = int(os.environ.get("UPDATE_WORKERS", "8"))
+UPDATE_DRAIN_TIMEOUT = float(os.environ.get("UPDATE_DRAIN_TIMEOUT", "10"))  # 秒，退出时等待队列清空
+# 牌价历史（SQLite WAL）；RATE_HISTORY_DB 置空则关闭
+RATE_HISTORY_DB = os.environ.get("RATE_HISTORY_DB", "rate_history.sqlite3")
+HISTORY_FLUSH_INTERVAL = float(os.environ.get("HISTORY_FLUSH_INTERVAL", "30"))  # 秒
+# webhook 注册参数：只接收已处理的更新类型；启动时与 getWebhookInfo 一致则不重复注册
+WEBHOOK_ALLOWED_UPDATES = ["message"]
+WEBHOOK_MAX_CONNECTIONS = int(os.environ.get("WEBHOOK_MAX_CONNECTIONS", "40"))  # 1-100
+# 事件循环看门狗：心跳测 lag，阻塞超过阈值时抓取事件循环线程调用栈（见 /__loop）
+LOOP_MONITOR = os.environ.get("LOOP_MONITOR", "1").lower() in {"1", "true", "yes"}
+LOOP_LAG_INTERVAL = float(os.environ.get("LOOP_LAG_INTERVAL", "0.1"))  # 秒
+LOOP_SLOW_THRESHOLD = float(os.environ.get("LOOP_SLOW_THRESHOLD", "0.1"))  # 秒
+# 管理接口（/__profile）鉴权；未设置则接口关闭
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+PROFILE_MAX_SECONDS = float(os.environ.get("PROFILE_MAX_SECONDS", "60"))
+# 批量兑换（兑换 1万, 5万, 10万 / 1万~10万）单次最多金额数
+CONVERT_MAX_AMOUNTS = int(os.environ.get("CONVERT_MAX_AMOUNTS", "20"))
+BOC_HEADERS = {
+    "User-Agent": ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+                   "AppleWebKit/537.36 (KHTML, like Gecko) "
+                   "Chrome/122.0.0.0 Safari/537.36"),
+    "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+}
 # 缓存：per_usd(Decimal, 每1USD)、pub_time(str|None)、raw_100(Decimal, 每100USD)
-_rate_cache = {"per_usd": None, "pub_time": None, "cached_at": None, "raw_100": None}
-# 待费率会话 & 费率记忆
-pending_fee = {}   # chat_id -> {"amount_usd": Decimal, "created_at": datetime, "last_fee": Decimal|None}
-last_fee_mem = {}  # chat_id -> Decimal
+# snapshot：同一次抓取得到的全部币种牌价（RateSnapshot；bocfx 兜底时为 None）
+_rate_cache = {"per_usd": None, "pub_time": None, "cached_at": None, "raw_100": None, "snapshot": None}
+# 待费率会话 & 费率记忆 & 共享牌价快照：统一经状态后端存取（有界、自动过期）
+#   "pending_fee"：chat_id -> {"amount": Decimal, "amounts": list[Decimal]|None（批量）, "currency": str,
+#                              "created_at": datetime, "last_fee": Decimal|None}
+#   "last_fee_mem"：chat_id -> Decimal
+#   "rate"：cache_key -> _rate_cache 的副本（仅共享后端使用，供其他 worker 复用）
+STATE_NAMESPACES = {
+    "pending_fee": (PENDING_CAPACITY, PENDING_TTL + PENDING_GRACE),
+    "last_fee_mem": (LAST_FEE_CAPACITY, LAST_FEE_TTL),
+    "rate": (16, RATE_MAX_STALE),
+}
+_state: StateBackend = MemoryBackend(STATE_NAMESPACES)
+# 单飞刷新：同一缓存键同时只允许一个抓取在途，其余请求等待同一结果
+_rate_inflight = {}  # cache_key -> asyncio.Task
+_rate_fetch_stats = {"hits": 0, "misses": 0, "originating": 0, "coalesced": 0, "stale_served": 0,
+                     "bocfx_fallbacks": 0}
+# 条件请求 & 页面指纹：ETag/Last-Modified 用于 304，body_hash 相同时跳过解析
+_boc_page_state = {"etag": None, "last_modified": None, "body_hash": None, "snapshot": None}
+_boc_fetch_stats = {"requests": 0, "bytes": 0, "not_modified": 0, "parse_skips": 0, "parses": 0,
+                    "parse_failures": 0}
+# /api/rate 响应体：按快照序列化一次后缓存为字节（key 为快照，bodies：币种或 "" -> (body, etag)）
+_api_rate_bodies = {"key": None, "bodies": {}}
+_api_stats = {"rate": 0, "rate_not_modified": 0, "rate_serialized": 0, "convert": 0}
+
+# ---------- 指标（/metrics） ----------
+BOC_FETCH_SECONDS = metrics.Histogram("bocbot_boc_fetch_seconds", "BOC 牌价页 HTTP 请求耗时")
+BOC_PARSE_SECONDS = metrics.Histogram("bocbot_boc_parse_seconds", "BOC 牌价页解析耗时")
+HANDLER_SECONDS = metrics.Histogram("bocbot_handler_seconds", "各命令处理耗时", ("command",))
+TELEGRAM_SEND_SECONDS = metrics.Histogram("bocbot_telegram_request_seconds", "出站 Bot API 请求耗时", ("method",))
+WEBHOOK_SECONDS = metrics.Histogram("bocbot_webhook_seconds", "webhook 响应耗时")
+LOOP_LAG_SECONDS = metrics.Histogram("bocbot_event_loop_lag_seconds", "事件循环延迟（心跳实际耗时 - 预期间隔）",
+                                     buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+STARTUP_IMPORT_SECONDS = metrics.Gauge("bocbot_startup_import_seconds", "main 模块导入耗时",
+                                       fn=lambda: _startup["import_ms"] / 1000)
+STARTUP_LIFESPAN_SECONDS = metrics.Gauge(
+    "bocbot_startup_lifespan_seconds", "lifespan 启动耗时（至可接收 webhook）",
+    fn=lambda: None if _startup["lifespan_ms"] is None else _startup["lifespan_ms"] / 1000)
+PENDING_SESSIONS = metrics.Gauge("bocbot_pending_sessions", "等待费率输入的会话数")
 
 # ---------- 工具函数 ----------
 def _clean_number(text: str | None) -> float | None:
@@ -95,61 +221,17 @@ def _parse_amount_to_decimal(text: str) -> Decimal | None:
     except InvalidOperation:
         return None
 
-# —— 新增：把带中文单位的金额转成 Decimal（支持：亿/万/千/百/十，支持链式：1万2千3百）——
-def _parse_amount_chinese(text: str) -> Decimal | None:
+def _parse_amount_any(text: str) -> Decimal | None:
     """
-    支持形式：
-      - 50万 -> 500000
-      - 3.5万 -> 35000
-      - 2亿 -> 200000000
-      - 1万2千 -> 12000
-      - 1万2千3百50 -> 12350
-    仅支持阿拉伯数字 + 单位（亿/万/千/百/十）的组合；不解析汉字数字（如“五十万”）。
+    纯数字、中文单位/数字（50万、五十万、一亿二千万）与 k/m 后缀（1.2k、$5m），见 amount_parser。
+    以数字结尾的 ASCII 文本先按 Decimal 直接解析（与 /convert 一致，含 1e5 这类写法），失败再交给单遍解析器；
+    含中文或以字母结尾（1.2k / $5m）的文本不可能是 Decimal 字面量，跳过这一步（省去抛出 / 捕获异常）。
     """
-    import re
-    if not text:
-        return None
-    # 保留数字、点、逗号和单位字符，其余删除（去掉“美元/美金/USD”等）
-    cleaned = re.sub(r"[^0-9\.\,亿万千百十]", "", text)
-    if not cleaned:
-        return None
-
-    # 先尝试纯数字直接转（避免“500000”这类被误判）
-    try:
-        pure = cleaned.replace(",", "")
-        if re.fullmatch(r"\d+(?:\.\d+)?", pure):
-            val = Decimal(pure)
-            return val if Decimal("0") < val <= Decimal("1000000000") else None
-    except Exception:
-        pass
-
-    # 解析带单位的片段并求和
-    unit_map = {"亿": Decimal("100000000"), "万": Decimal("10000"),
-                "千": Decimal("1000"), "百": Decimal("100"), "十": Decimal("10"), "": Decimal("1")}
-    # 匹配若干个 “数字 + 可选单位” 片段
-    parts = re.findall(r"(\d+(?:\.\d+)?)([亿万千百十]?)", cleaned)
-    if not parts:
-        return None
-
-    total = Decimal("0")
-    try:
-        for num_str, unit in parts:
-            num = Decimal(num_str)
-            total += num * unit_map.get(unit, Decimal("1"))
-    except Exception:
-        return None
-
-    # 边界保护
-    if total <= 0 or total > Decimal("1000000000"):
-        return None
-    return total.quantize(Decimal("0.0001"), rounding=ROUND_HALF_UP)
-
-def _parse_amount_any(text: str) -> Decimal | None:
-    """先按纯数字解析，失败再按中文单位解析"""
-    val = _parse_amount_to_decimal(text)
-    if val is not None:
-        return val
-    return _parse_amount_chinese(text)
+    if text.isascii() and text.rstrip()[-1:].isdigit():
+        val = _parse_amount_to_decimal(text)
+        if val is not None:
+            return val
+    return parse_amount(text)
 
 def _parse_percent_to_decimal(text: str) -> Decimal | None:
     try:
@@ -161,205 +243,612 @@ def _parse_percent_to_decimal(text: str) -> Decimal | None:
     except InvalidOperation:
         return None
 
+def _split_currency(text: str) -> tuple[str, str]:
+    """
+    从金额文本中拆出币种，返回 (金额文本, 币种代码)，未写币种默认 USD。
+    支持尾部三位代码（100 EUR / 100eur）或牌价页中文名（100欧元 / 50万日元）。
+    """
+    t = text.strip()
+    tail = t[-3:]
+    if len(t) > 3 and tail.isascii() and tail.isalpha() and tail.upper() in CURRENCY_NAMES:
+        return t[:-3].strip(), tail.upper()
+    for name, code in CURRENCY_CODES.items():
+        if name in t:
+            return t.replace(name, "").strip(), code
+    return t, "USD"
+
+def _ccy_units(code: str) -> tuple[str, str]:
+    """币种展示名：(名称, 单位)，美元保持“美金 / 美元”"""
+    if code == "USD":
+        return "美金", "美元"
+    return CURRENCY_NAMES.get(code, code), code
+
+def _parse_rate_args(tokens: list[str]) -> tuple[str, str] | None:
+    """/rate 参数：[币种] [价格类型]，顺序不限；缺省 USD 现汇卖出。无法识别返回 None"""
+    code, kind = "USD", "SE_ASK"
+    for tok in tokens:
+        pt = price_type(tok)
+        if pt is not None:
+            kind = pt
+            continue
+        c = currency_code(tok)
+        if c is not None:
+            code = c
+            continue
+        return None
+    return code, kind
+
 def _now_tz():
     # 中国时间
     return datetime.now(timezone(timedelta(hours=8)))
 
+# ---------- 共享 HTTP 客户端（keep-alive 连接池） ----------
+_http_client = None  # httpx.AsyncClient | None
+
+def _build_http_client() -> httpx.AsyncClient:
+    http2 = HTTP2_ENABLED
+    if http2:
+        try:
+            import h2  # noqa: F401  httpx 的 HTTP/2 需要 h2 包
+        except ImportError:
+            print("警告：BOC_HTTP2 已开启但未安装 h2，退回 HTTP/1.1。")
+            http2 = False
+    limits = httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+    return httpx.AsyncClient(timeout=12, headers=BOC_HEADERS, limits=limits, http2=http2)
+
+def set_http_client(client) -> None:
+    """注入共享客户端（lifespan 或测试使用）；传 None 清除。"""
+    global _http_client
+    _http_client = client
+
+def get_http_client() -> httpx.AsyncClient:
+    """返回共享客户端；lifespan 之外（脚本/测试）首次调用时懒创建。"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = _build_http_client()
+    return _http_client
+
 # ---------- 抓取中行牌价（官方优先，bocfx 兜底），带缓存 ----------
-async def fetch_boc_official_usd_se_ask_httpx():
+def _decode_boc_page(r: httpx.Response) -> str:
+    """响应头声明了编码则按声明解码；否则先试 UTF-8，不合法时按 GB18030（中行页面的实际编码）"""
+    if r.charset_encoding:
+        return r.text
+    try:
+        return r.content.decode("utf-8")
+    except UnicodeDecodeError:
+        return r.content.decode("gb18030", errors="replace")
+
+async def fetch_boc_snapshot_httpx(client: httpx.AsyncClient | None = None) -> RateSnapshot | None:
     """
-    抓取中国银行官网“美元 现汇卖出价”
-    返回： (per_usd(Decimal), pub_time(str|None), raw_100(Decimal)) 或 (None, None, None)
+    抓取中国银行官网整张牌价表（复用共享连接池，可传入 client 覆盖），返回 RateSnapshot 或 None。
+    服务器支持时发送 If-None-Match / If-Modified-Since；返回 304 或页面内容哈希未变时
+    直接复用上次解析结果。计数见 fetch_boc_official_usd_se_ask_httpx.stats。
     """
-    headers = {
-        "User-Agent": ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                       "AppleWebKit/537.36 (KHTML, like Gecko) "
-                       "Chrome/122.0.0.0 Safari/537.36"),
-        "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-    }
+    state = _boc_page_state
     try:
-        async with httpx.AsyncClient(timeout=12, headers=headers) as client:
-            r = await client.get(BOC_URL)
-        text = r.text
-        if not text or "<table" not in text:
-            r.encoding = "gb18030"
-            text = r.text
-
-        soup = BeautifulSoup(text, "lxml")
-        tables = soup.find_all("table")
-        for table in tables:
-            header_tr = table.find("tr")
-            if not header_tr:
-                continue
-            ths = [th.get_text(strip=True) for th in header_tr.find_all(["th", "td"])]
-            if not ths:
-                continue
-
-            col_ask = None
-            col_time = None
-            for i, name in enumerate(ths):
-                if ("现汇卖出" in name) and col_ask is None:
-                    col_ask = i
-                if ("发布时间" in name or "发布日期" in name or "Pub" in name) and col_time is None:
-                    col_time = i
-
-            if col_ask is None:
-                continue
-
-            for tr in table.find_all("tr")[1:]:
-                tds = tr.find_all("td")
-                if not tds:
-                    continue
-                cc_name = tds[0].get_text(strip=True) if len(tds) > 0 else ""
-                if cc_name and ("美元" in cc_name or "USD" in cc_name.upper()):
-                    ask_text = tds[col_ask].get_text(strip=True) if col_ask < len(tds) else ""
-                    ask_raw = _clean_number(ask_text)
-                    if ask_raw is None:
-                        continue
-                    raw_100 = Decimal(str(ask_raw))
-                    per_usd = (raw_100 / Decimal("100"))
-                    pub_time = None
-                    if col_time is not None and col_time < len(tds):
-                        pub_time = tds[col_time].get_text(strip=True) or None
-                    return per_usd, pub_time, raw_100
-        return None, None, None
+        cond_headers = {}
+        if state["snapshot"] is not None:
+            if state["etag"]:
+                cond_headers["If-None-Match"] = state["etag"]
+            if state["last_modified"]:
+                cond_headers["If-Modified-Since"] = state["last_modified"]
+        t0 = time.perf_counter()
+        r = await (client or get_http_client()).get(BOC_URL, headers=cond_headers)
+        BOC_FETCH_SECONDS.observe(time.perf_counter() - t0)
+        _boc_fetch_stats["requests"] += 1
+        _boc_fetch_stats["bytes"] += r.num_bytes_downloaded or len(r.content)
+
+        if r.status_code == HTTPStatus.NOT_MODIFIED and state["snapshot"] is not None:
+            _boc_fetch_stats["not_modified"] += 1
+            return state["snapshot"]
+
+        # ETag / Last-Modified 只与成功解析的快照一起保存：解析失败时若先存了新 ETag，
+        # 下次会拿到 304 并把旧快照当作最新页面返回（也不会再走 bocfx 兜底）
+        validators = (r.headers.get("ETag"), r.headers.get("Last-Modified")) if r.is_success else (None, None)
+        body_hash = hashlib.blake2b(r.content, digest_size=16).digest()
+        if body_hash == state["body_hash"] and state["snapshot"] is not None:
+            _boc_fetch_stats["parse_skips"] += 1
+            state["etag"], state["last_modified"] = validators
+            return state["snapshot"]
+
+        text = _decode_boc_page(r)
+
+        _boc_fetch_stats["parses"] += 1
+        t0 = time.perf_counter()
+        snapshot = parse_snapshot(text)
+        BOC_PARSE_SECONDS.observe(time.perf_counter() - t0)
+        if snapshot is None:
+            _boc_fetch_stats["parse_failures"] += 1
+            return None
+        state["etag"], state["last_modified"] = validators
+        state["body_hash"] = body_hash
+        state["snapshot"] = snapshot
+        return snapshot
     except Exception as e:
         print("DEBUG fetch_boc_official error:", e)
+        return None
+
+def _usd_from_snapshot(snapshot: RateSnapshot | None):
+    """从快照取 (per_usd, pub_time, raw_100)；缺失返回 (None, None, None)"""
+    row = snapshot.get("USD") if snapshot is not None else None
+    if row is None or row.se_ask is None:
         return None, None, None
+    return row.se_ask / Decimal("100"), row.pub_time, row.se_ask
 
-def fetch_bocfx_usd_se_ask():
+async def fetch_boc_official_usd_se_ask_httpx(client: httpx.AsyncClient | None = None):
     """
-    bocfx 兜底：返回 (per_usd(Decimal), pub_time(None), raw_100(Decimal)) 或 (None,None,None)
+    抓取中国银行官网“美元 现汇卖出价”
+    返回： (per_usd(Decimal), pub_time(str|None), raw_100(Decimal)) 或 (None, None, None)
     """
-    attempts = [("USD", "SE,ASK"), ("USD,CNY", "SE,ASK"), ("USD", None)]
-    for farg, sarg in attempts:
+    return _usd_from_snapshot(await fetch_boc_snapshot_httpx(client))
+
+fetch_boc_official_usd_se_ask_httpx.stats = _boc_fetch_stats
+
+BOCFX_ATTEMPTS = [("USD", "SE,ASK"), ("USD,CNY", "SE,ASK"), ("USD", None)]
+_bocfx_executor = None  # ThreadPoolExecutor | None
+
+def _get_bocfx_executor() -> ThreadPoolExecutor:
+    global _bocfx_executor
+    if _bocfx_executor is None:
+        _bocfx_executor = ThreadPoolExecutor(max_workers=BOCFX_WORKERS, thread_name_prefix="bocfx")
+    return _bocfx_executor
+
+def _shutdown_bocfx_executor() -> None:
+    global _bocfx_executor
+    if _bocfx_executor is not None:
+        _bocfx_executor.shutdown(wait=False, cancel_futures=True)
+        _bocfx_executor = None
+
+_bocfx = None  # bocfx 函数；首次兜底时导入
+
+def _load_bocfx():
+    global _bocfx
+    if _bocfx is None:
+        t0 = time.perf_counter()
+        from bocfx import bocfx
+        _startup["lazy_imports"]["bocfx_ms"] = _ms_since(t0)
+        _bocfx = bocfx
+    return _bocfx
+
+def _bocfx_attempt(farg: str, sarg: str | None):
+    """单次 bocfx 调用，返回每100USD牌价(float) 或 None（阻塞，勿在事件循环线程直接调用）"""
+    bocfx = _load_bocfx()
+    res = bocfx(farg, sarg) if sarg else bocfx(farg)
+    val = _first_number_deep(res)
+    if val is not None and math.isfinite(val):
+        return val
+    return None
+
+async def fetch_bocfx_usd_se_ask_async():
+    """
+    bocfx 兜底：在有界线程池中逐个尝试，每次最多等待 BOCFX_ATTEMPT_TIMEOUT 秒，
+    不阻塞事件循环。超时的尝试会被取消（尚未开始时）或被放弃（线程无法强制中断）。
+    """
+    loop = asyncio.get_running_loop()
+    executor = _get_bocfx_executor()
+    for farg, sarg in BOCFX_ATTEMPTS:
+        fut = loop.run_in_executor(executor, _bocfx_attempt, farg, sarg)
         try:
-            res = bocfx(farg, sarg) if sarg else bocfx(farg)
-            val = _first_number_deep(res)
-            if val is not None and math.isfinite(val):
-                raw_100 = Decimal(str(val))
-                per_usd = raw_100 / Decimal("100")
-                return per_usd, None, raw_100
+            val = await asyncio.wait_for(fut, BOCFX_ATTEMPT_TIMEOUT)
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            print(f"DEBUG bocfx 超时（{BOCFX_ATTEMPT_TIMEOUT}s）：", farg, sarg)
+            continue
         except BaseException:
             continue
+        if val is not None:
+            raw_100 = Decimal(str(val))
+            per_usd = raw_100 / Decimal("100")
+            return per_usd, None, raw_100
     return None, None, None
 
-async def get_usd_per_usd_with_cache():
-    """返回 (per_usd, pub_time, raw_100)；若缓存过期则刷新。"""
+async def _adopt_shared_rate(cache_key: str = "USD") -> bool:
+    """
+    共享后端中若有其他 worker 刚刷新过的牌价（比本地新，且未到预刷新时间），直接采用，
+    避免每个 worker 各自抓取。采用成功返回 True。
+    """
+    if not _state.shared:
+        return False
     try:
-        if _rate_cache["per_usd"] and _rate_cache["cached_at"]:
-            if (_now_tz() - _rate_cache["cached_at"]).total_seconds() < RATE_TTL:
+        shared = await _state.get("rate", cache_key)
+    except Exception as e:
+        print("DEBUG shared rate read:", e)
+        return False
+    if not shared or not shared.get("per_usd") or not shared.get("cached_at"):
+        return False
+    local_at = _rate_cache["cached_at"]
+    if local_at is not None and shared["cached_at"] <= local_at:
+        return False
+    if (_now_tz() - shared["cached_at"]).total_seconds() >= max(RATE_TTL - RATE_REFRESH_AHEAD, 1):
+        return False
+    _rate_cache.update(shared)
+    return True
+
+async def _refresh_usd_rate():
+    """实际抓取（官方优先，bocfx 兜底）并写入缓存；共享后端中已有较新的牌价时直接复用。"""
+    if await _adopt_shared_rate():
+        return _rate_cache["per_usd"], _rate_cache["pub_time"], _rate_cache["raw_100"]
+    snapshot = await fetch_boc_snapshot_httpx()
+    per_usd, pub_time, raw_100 = _usd_from_snapshot(snapshot)
+    if per_usd is None:
+        snapshot = None
+        _rate_fetch_stats["bocfx_fallbacks"] += 1
+        per_usd, pub_time, raw_100 = await fetch_bocfx_usd_se_ask_async()
+    if per_usd is not None:
+        _rate_cache["per_usd"] = per_usd
+        _rate_cache["pub_time"] = pub_time
+        _rate_cache["raw_100"] = raw_100
+        _rate_cache["snapshot"] = snapshot
+        _rate_cache["cached_at"] = _now_tz()
+        if _history is not None and _history.record(snapshot, _rate_cache["cached_at"]):
+            _history_flush_event.set()
+        if _state.shared:
+            try:
+                await _state.set("rate", "USD", dict(_rate_cache))
+            except Exception as e:
+                print("DEBUG shared rate write:", e)
+    return per_usd, pub_time, raw_100
+
+def _rate_age_seconds() -> float | None:
+    """当前缓存距上次成功刷新的秒数；无缓存返回 None"""
+    if not _rate_cache["per_usd"] or not _rate_cache["cached_at"]:
+        return None
+    return (_now_tz() - _rate_cache["cached_at"]).total_seconds()
+
+def is_rate_stale() -> bool:
+    """缓存已超过 RATE_TTL（正在/等待后台刷新）"""
+    age = _rate_age_seconds()
+    return age is not None and age >= RATE_TTL
+
+def _start_rate_refresh(cache_key: str = "USD") -> asyncio.Task:
+    """单飞：已有在途刷新则复用，否则发起新的刷新任务"""
+    task = _rate_inflight.get(cache_key)
+    if task is None:
+        _rate_fetch_stats["originating"] += 1
+        task = asyncio.create_task(_refresh_usd_rate())
+        _rate_inflight[cache_key] = task
+        task.add_done_callback(lambda _t: _rate_inflight.pop(cache_key, None))
+    else:
+        _rate_fetch_stats["coalesced"] += 1
+    return task
+
+async def get_usd_per_usd_with_cache(cache_key: str = "USD"):
+    """
+    返回 (per_usd, pub_time, raw_100)；若缓存过期则刷新。
+    并发过期时只发起一次抓取（originating），其余调用等待同一结果（coalesced），
+    计数见 get_usd_per_usd_with_cache.stats。
+    缓存过期但未超过 RATE_MAX_STALE 时直接返回旧值（stale_served，可用 is_rate_stale() 判断），
+    刷新在后台进行。
+    """
+    try:
+        age = _rate_age_seconds()
+        if age is not None:
+            if age < RATE_TTL:
+                _rate_fetch_stats["hits"] += 1
+                return _rate_cache["per_usd"], _rate_cache["pub_time"], _rate_cache["raw_100"]
+            if age < RATE_MAX_STALE:
+                _rate_fetch_stats["stale_served"] += 1
+                _start_rate_refresh(cache_key)
                 return _rate_cache["per_usd"], _rate_cache["pub_time"], _rate_cache["raw_100"]
 
-        per_usd, pub_time, raw_100 = await fetch_boc_official_usd_se_ask_httpx()
-        if per_usd is None:
-            per_usd, pub_time, raw_100 = fetch_bocfx_usd_se_ask()
-        if per_usd is not None:
-            _rate_cache["per_usd"] = per_usd
-            _rate_cache["pub_time"] = pub_time
-            _rate_cache["raw_100"] = raw_100
-            _rate_cache["cached_at"] = _now_tz()
-        return per_usd, pub_time, raw_100
+        # shield：单个调用方被取消时不影响其他等待者
+        _rate_fetch_stats["misses"] += 1
+        return await asyncio.shield(_start_rate_refresh(cache_key))
     except Exception as e:
         print("DEBUG get_usd_per_usd_with_cache:", e)
         return None, None, None
 
-# ---------- /rate（含“汇率”别名） ----------
-async def cmd_rate_core(update: Update, context: ContextTypes.DEFAULT_TYPE):
+get_usd_per_usd_with_cache.stats = _rate_fetch_stats
+
+async def get_rate_with_cache(code: str = "USD", price_kind: str = "SE_ASK"):
+    """
+    任意币种/价格类型，返回 (per_unit, pub_time, raw_100)；与美元共用同一次抓取的快照，
+    不额外请求上游。币种或价格缺失（或仅有 bocfx 兜底数据）返回 (None, None, None)。
+    """
     per_usd, pub_time, raw_100 = await get_usd_per_usd_with_cache()
-    if per_usd is None:
-        await update.message.reply_text("暂时未获取到中国银行牌价。")
+    if code == "USD" and price_kind == "SE_ASK":
+        return per_usd, pub_time, raw_100
+    snapshot = _rate_cache["snapshot"]
+    row = snapshot.get(code) if snapshot is not None else None
+    raw = row.price(price_kind) if row is not None else None
+    if raw is None:
+        return None, None, None
+    return raw / Decimal("100"), row.pub_time, raw
+
+# ---------- 牌价历史 ----------
+_history = None  # RateHistory | None
+_history_flush_event = asyncio.Event()
+
+async def _history_flush_loop():
+    """后台批量落盘：每 HISTORY_FLUSH_INTERVAL 秒或缓冲满时写一次"""
+    while True:
+        try:
+            await asyncio.wait_for(_history_flush_event.wait(), HISTORY_FLUSH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _history_flush_event.clear()
+        try:
+            await asyncio.to_thread(_history.flush)
+        except Exception as e:
+            print("DEBUG history flush:", e)
+
+def _parse_history_window(text: str):
+    """
+    “24h / 30d / 90m” -> ("range", 起始时间)；“2026-10-01 10:30” -> ("at", 时刻)；
+    空串默认近 24 小时；无法识别或超出 datetime 范围（9999999d）返回 None
+    """
+    t = text.strip().lower()
+    if not t:
+        return "range", _now_tz() - timedelta(hours=24)
+    units = {"m": "minutes", "h": "hours", "d": "days"}
+    if t[-1] in units and t[:-1].isdigit():
+        try:
+            return "range", _now_tz() - timedelta(**{units[t[-1]]: int(t[:-1])})
+        except (OverflowError, ValueError):
+            return None
+    for fmt in ("%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S", "%Y.%m.%d %H:%M", "%Y-%m-%dT%H:%M", "%Y-%m-%d"):
+        try:
+            return "at", datetime.strptime(t, fmt).replace(tzinfo=CN_TZ)
+        except ValueError:
+            continue
+    return None
+
+async def query_history(code: str, kind: str, window: str):
+    """返回 ("range", [(时间, raw_100), ...]) / ("at", (时间, raw_100)|None)；参数非法或未启用返回 None"""
+    if _history is None:
+        return None
+    parsed = _parse_history_window(window)
+    if parsed is None:
+        return None
+    mode, when = parsed
+    if mode == "range":
+        return mode, await asyncio.to_thread(_history.range, code, when, None, kind)
+    return mode, await asyncio.to_thread(_history.at, code, when, kind)
+
+# ---------- 会话状态清理 ----------
+async def _state_sweeper_loop():
+    """定期清理过期的待费率会话与费率记忆"""
+    while True:
+        await asyncio.sleep(STATE_SWEEP_INTERVAL)
+        try:
+            await _state.sweep()
+        except Exception as e:
+            print("DEBUG state sweep:", e)
+
+async def state_stats() -> dict:
+    """各命名空间的规模与淘汰/过期计数"""
+    return {"backend": type(_state).__name__, **(await _state.stats())}
+
+async def _open_state_backend():
+    global _state
+    if STATE_BACKEND != "sqlite":
+        return
+    try:
+        _state = await asyncio.to_thread(SqliteBackend, STATE_DB, STATE_NAMESPACES)
+    except Exception as e:
+        print("共享状态库打开失败，退回内存后端：", e)
+
+async def _close_state_backend():
+    global _state
+    await _state.close()
+    _state = MemoryBackend(STATE_NAMESPACES)
+
+async def _rate_refresher_loop():
+    """后台任务：在缓存过期前预先刷新，让请求路径只读内存"""
+    while True:
+        try:
+            age = _rate_age_seconds()
+            if age is not None:
+                delay = max(RATE_TTL - RATE_REFRESH_AHEAD, 1) - age
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                    continue
+            per_usd, _, _ = await asyncio.shield(_start_rate_refresh())
+            if per_usd is None:
+                await asyncio.sleep(RATE_REFRESH_RETRY)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print("DEBUG rate refresher:", e)
+            await asyncio.sleep(RATE_REFRESH_RETRY)
+
+# ---------- /rate（含“汇率”别名） ----------
+RATE_USAGE = "用法：/rate [币种] [价格类型]。例如：/rate、/rate EUR、/rate JPY 现钞买入"
+
+async def cmd_rate_core(update: Update, context: ContextTypes.DEFAULT_TYPE,
+                        code: str = "USD", kind: str = "SE_ASK"):
+    per_unit, pub_time, raw_100 = await get_rate_with_cache(code, kind)
+    if per_unit is None:
+        if code == "USD" and kind == "SE_ASK":
+            await update.message.reply_text("暂时未获取到中国银行牌价。")
+        else:
+            await update.message.reply_text(f"暂时未获取到中国银行 {code} {PRICE_LABELS[kind]}。")
         return
     time_str = pub_time if pub_time else "未知"
+    prefix = "" if code == "USD" else f"{CURRENCY_NAMES.get(code, code)} "
     msg = (
-        f"现汇卖出价（SE,ASK）：{_fmt_money(per_usd)} CNY / 1 USD\n"
-        f"牌价：{_fmt_money(raw_100)} CNY / 100 USD\n"
+        f"{prefix}{PRICE_LABELS[kind]}：{_fmt_money(per_unit)} CNY / 1 {code}\n"
+        f"牌价：{_fmt_money(raw_100)} CNY / 100 {code}\n"
         f"挂牌时间（北京时间，UTC+8）：{time_str}\n"
         f"来源：{BOC_URL}"
     )
+    if is_rate_stale():
+        msg += "\n（缓存牌价，后台刷新中）"
     await update.message.reply_text(msg)
 
 async def cmd_rate(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await cmd_rate_core(update, context)
+    parsed = _parse_rate_args(context.args or [])
+    if parsed is None:
+        await update.message.reply_text(RATE_USAGE)
+        return
+    await cmd_rate_core(update, context, *parsed)
 
 async def alias_rate(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    # “汇率”或“/汇率”文本别名
-    await cmd_rate_core(update, context)
+    # “汇率”或“/汇率”文本别名，可带参数：汇率 EUR / 汇率 日元 现钞买入
+    text = (update.message.text or "").strip().lstrip("/").strip()
+    parsed = _parse_rate_args(text[len("汇率"):].split())
+    if parsed is None:
+        await update.message.reply_text(RATE_USAGE)
+        return
+    await cmd_rate_core(update, context, *parsed)
 
-# ---------- /convert（仅美金->人民币） ----------
-async def start_convert_flow(update: Update, context: ContextTypes.DEFAULT_TYPE, amount: Decimal):
+# ---------- /history ----------
+HISTORY_USAGE = "用法：/history [币种] [价格类型] [24h|30d|2026-10-01 10:30]。例如：/history、/history EUR 30d"
+
+async def cmd_history(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    args = context.args or []
+    # 前面的参数若是币种/价格类型则取出，其余作为时间窗口
+    i = 0
+    while i < len(args) and _parse_rate_args(args[:i + 1]) is not None:
+        i += 1
+    code, kind = _parse_rate_args(args[:i])
+    result = await query_history(code, kind, " ".join(args[i:]))
+    if result is None:
+        await update.message.reply_text(HISTORY_USAGE if _history is not None else "未启用牌价历史。")
+        return
+
+    mode, data = result
+    head = f"{code} {PRICE_LABELS[kind]}"
+    if mode == "at":
+        if data is None:
+            await update.message.reply_text(f"{head}：该时间之前没有记录。")
+            return
+        ts, raw = data
+        await update.message.reply_text(
+            f"{head}：{_fmt_money(raw / Decimal('100'))} CNY / 1 {code}\n"
+            f"挂牌时间（北京时间，UTC+8）：{ts:%Y-%m-%d %H:%M:%S}"
+        )
+        return
+
+    if not data:
+        await update.message.reply_text(f"{head}：该区间内没有记录。")
+        return
+    prices = [raw for _, raw in data]
+    first_ts, first = data[0]
+    last_ts, last = data[-1]
+    await update.message.reply_text(
+        f"{head}（{first_ts:%Y-%m-%d %H:%M} ~ {last_ts:%Y-%m-%d %H:%M}，共 {len(data)} 条）\n"
+        f"最新：{_fmt_money(last / Decimal('100'))}\n"
+        f"最早：{_fmt_money(first / Decimal('100'))}\n"
+        f"最高：{_fmt_money(max(prices) / Decimal('100'))}\n"
+        f"最低：{_fmt_money(min(prices) / Decimal('100'))}"
+    )
+
+# ---------- /convert（外币->人民币，默认美金） ----------
+CONVERT_TOO_MANY = f"一次最多计算 {CONVERT_MAX_AMOUNTS} 个金额，请缩小区间或增大步长。"
+
+async def start_convert_flow(update: Update, context: ContextTypes.DEFAULT_TYPE, amount: Decimal | list[Decimal],
+                             currency: str = "USD"):
+    """amount 为列表且多于一项时进入批量报价：只询问一次费率，结果合并为一张表"""
+    amounts = None
+    if isinstance(amount, list):
+        if len(amount) > 1:
+            amounts = amount
+        amount = amount[0]
     chat_id = update.effective_chat.id
-    last = last_fee_mem.get(chat_id)
-    pending_fee[chat_id] = {
-        "amount_usd": amount,
+    last = await _state.get("last_fee_mem", chat_id)
+    await _state.set("pending_fee", chat_id, {
+        "amount": amount,
+        "amounts": amounts,
+        "currency": currency,
         "created_at": _now_tz(),
         "last_fee": last,
-    }
+    })
+    head = f"共 {len(amounts)} 个金额。" if amounts else ""
     if last is not None:
         await update.message.reply_text(
-            f"上次费率为 {last}% ，是否沿用？发送“是”直接计算，或发送新的百分比（如 2.3），发送“取消”退出。"
+            f"{head}上次费率为 {last}% ，是否沿用？发送“是”直接计算，或发送新的百分比（如 2.3），发送“取消”退出。"
         )
     else:
-        await update.message.reply_text("请输入手续费率（百分比）。例如 2.3 表示 2.3%。发送“取消”退出。")
+        await update.message.reply_text(f"{head}请输入手续费率（百分比）。例如 2.3 表示 2.3%。发送“取消”退出。")
 
 async def cmd_convert(update: Update, context: ContextTypes.DEFAULT_TYPE):
     args = context.args
     if not args:
-        await update.message.reply_text("用法：/convert 金额（单位：美金）。例如：/convert 500000")
+        await update.message.reply_text(
+            "用法：/convert 金额 [币种，默认美金]。例如：/convert 500000、/convert 10000 EUR、"
+            "/convert 10000, 50000, 100000、/convert 10000-50000/10000"
+        )
         return
-    amount = _parse_amount_to_decimal(args[0])
-    if amount is None:
+    amount_text, currency = _split_currency(" ".join(args))
+    amounts = parse_amounts(amount_text, _parse_amount_to_decimal, CONVERT_MAX_AMOUNTS)
+    if amounts is None:
         await update.message.reply_text("请输入合法的金额（仅数字，最大 1e9）。例如：/convert 500000")
         return
-    await start_convert_flow(update, context, amount)
+    if len(amounts) > CONVERT_MAX_AMOUNTS:
+        await update.message.reply_text(CONVERT_TOO_MANY)
+        return
+    await start_convert_flow(update, context, amounts, currency)
+
+_RE_CONVERT_ARGS = re.compile(r"^兑换\s*(.+?)\s*$")
 
 async def alias_convert(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
-    中文别名：匹配 “兑换 <金额>”，金额可为：
+    中文别名：匹配 “兑换 <金额> [币种]”，金额可为：
       - 纯数字：500000 / 12345.67
       - 带中文单位：50万 / 3.5万 / 2亿 / 1万2千 等
+      - 中文数字与后缀：五十万 / 一亿二千万 / 1.2k / $5m
+      - 多个金额或区间（批量报价）：1万, 5万, 10万 / 1万 5万 10万 / 1万~10万 / 1万-10万/2万
+    币种可写代码或中文名（兑换 1万 EUR / 兑换 50万日元），默认美金。
     """
-    import re
     text = (update.message.text or "").strip()
     # 捕获“兑换”后的全部内容，交给解析器处理
-    m = re.match(r"^兑换\s*(.+?)\s*$", text)
+    m = _RE_CONVERT_ARGS.match(text)
     if not m:
         await update.message.reply_text("用法：兑换 金额（单位：美金）。例如：兑换 500000 / 兑换 50万")
         return
-    token = m.group(1)
+    token, currency = _split_currency(m.group(1))
 
-    amt = _parse_amount_any(token)
-    if amt is None:
-        await update.message.reply_text("请输入合法的金额，例如：兑换 500000 或 兑换 50万")
+    amounts = parse_amounts(token, _parse_amount_any, CONVERT_MAX_AMOUNTS)
+    if amounts is None:
+        await update.message.reply_text("请输入合法的金额，例如：兑换 500000、兑换 50万 或 兑换 1万, 5万, 10万")
+        return
+    if len(amounts) > CONVERT_MAX_AMOUNTS:
+        await update.message.reply_text(CONVERT_TOO_MANY)
         return
 
-    await start_convert_flow(update, context, amt)
+    await start_convert_flow(update, context, amounts, currency)
+
+def _format_batch_quote(amounts: list[Decimal], per_unit: Decimal, fee_pct: Decimal,
+                        label: str, unit: str, time_str: str) -> str:
+    """批量报价表：同一牌价 / 费率一次算完（quote_batch），每个金额一行"""
+    lines = [
+        f"{label}兑人民币（手续费 {fee_pct}%，使用汇率 {_fmt_money(per_unit)}）",
+        f"{unit} | 人民币（不含手续费） | 手续费（元） | 合计（元）",
+    ]
+    for fx, (cny_no_fee, fee_cny, _, total_cny, _, _) in zip(amounts, quote_batch(amounts, per_unit, fee_pct)):
+        lines.append(f"{_fmt_money(fx)} | {fmt_units(cny_no_fee)} | {fmt_units(fee_cny)} | {fmt_units(total_cny)}")
+    lines.append(f"挂牌时间（北京时间，UTC+8）：{time_str}")
+    lines.append(f"来源：{BOC_URL}")
+    if is_rate_stale():
+        lines.append("（缓存牌价，后台刷新中）")
+    return "\n".join(lines)
 
 async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
-    非命令文本：用于费率输入，也支持“汇率”别名（已在 alias_rate 单独处理）
+    其余文本（路由分类为 "text"）：仅用于待费率会话的费率输入；
+    “汇率” / “兑换”别名已由 _classify_message 分到 alias_rate / alias_convert
     """
     text = (update.message.text or "").strip()
     chat_id = update.effective_chat.id
 
-    # 别名触发：汇率 / /汇率（优先被 alias_rate 的 Regex 捕获，这里兜底）
-    if text in {"汇率", "/汇率"}:
-        await cmd_rate_core(update, context)
-        return
-
     # 仅在等待费率时处理
-    state = pending_fee.get(chat_id)
+    state = await _state.get("pending_fee", chat_id)
     if not state:
         return
 
     if (_now_tz() - state["created_at"]).total_seconds() > PENDING_TTL:
-        pending_fee.pop(chat_id, None)
+        await _state.pop("pending_fee", chat_id)
         await update.message.reply_text("已超时取消。请重新发送 /convert 金额。")
         return
 
     if text in {"取消", "cancel", "Cancel"}:
-        pending_fee.pop(chat_id, None)
+        await _state.pop("pending_fee", chat_id)
         await update.message.reply_text("已取消。")
         return
 
@@ -371,33 +860,33 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text("请输入合法的百分比（例如 2.3），或发送“取消”。")
             return
         fee_pct = fee
-        last_fee_mem[chat_id] = fee_pct  # 记忆
+        await _state.set("last_fee_mem", chat_id, fee_pct)  # 记忆
 
-    amount_usd = state["amount_usd"]
-    pending_fee.pop(chat_id, None)
+    amount = state["amount"]
+    currency = state.get("currency", "USD")
+    await _state.pop("pending_fee", chat_id)
 
-    per_usd, pub_time, raw_100 = await get_usd_per_usd_with_cache()
-    if per_usd is None:
+    per_unit, pub_time, raw_100 = await get_rate_with_cache(currency)
+    if per_unit is None:
         await update.message.reply_text("暂时未获取到中国银行牌价。")
         return
 
     time_str = pub_time if pub_time else "未知"
-    usd = Decimal(amount_usd)
-
-    # 计算（人民币以每1美元价计算）
-    cny_no_fee = (usd * Decimal(per_usd)).quantize(Decimal("0.0001"), rounding=ROUND_HALF_UP)
-    fee_ratio = (Decimal(fee_pct) / Decimal("100"))
-    fee_cny = (cny_no_fee * fee_ratio).quantize(Decimal("0.0001"), rounding=ROUND_HALF_UP)
-    fee_usd = (fee_cny / Decimal(per_usd)).quantize(Decimal("0.0001"), rounding=ROUND_HALF_UP)
-    total_cny = (cny_no_fee + fee_cny).quantize(Decimal("0.0001"), rounding=ROUND_HALF_UP)
-    total_usd = (usd + fee_usd).quantize(Decimal("0.0001"), rounding=ROUND_HALF_UP)
-    total_rate = (total_cny / usd).quantize(Decimal("0.0001"), rounding=ROUND_HALF_UP)
-
-    # A 外发复制版：仅 美金 / 人民币（最终含手续费） / 简洁汇率数字 + 时间 + 来源
+    label, unit = _ccy_units(currency)
+    if state.get("amounts"):
+        await update.message.reply_text(
+            _format_batch_quote(state["amounts"], per_unit, fee_pct, label, unit, time_str))
+        return
+    fx = Decimal(amount)
+
+    # 1e-4 单位整数，直接格式化，不经 Decimal
+    cny_no_fee, fee_cny, fee_fx, total_cny, total_fx, total_rate = quote_units(fx, per_unit, fee_pct)
+
+    # A 外发复制版：仅 外币 / 人民币（最终含手续费） / 简洁汇率数字 + 时间 + 来源
     msg_a = (
-        f"美金：{_fmt_money(usd)} 美元\n"
-        f"人民币：{_fmt_money(total_cny)} 元\n"
-        f"使用汇率：{_fmt_money(Decimal(per_usd))}\n"
+        f"{label}：{_fmt_money(fx)} {unit}\n"
+        f"人民币：{fmt_units(total_cny)} 元\n"
+        f"使用汇率：{_fmt_money(Decimal(per_unit))}\n"
         f"挂牌时间（北京时间，UTC+8）：{time_str}\n"
         f"来源：{BOC_URL}"
     )
@@ -405,64 +894,340 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # B 明细版：自用（保持完整细目 + 总额换算汇率）
     msg_b = (
-        f"美金：{_fmt_money(usd)} 美元\n"
-        f"人民币：{_fmt_money(cny_no_fee)} 元（不含手续费）\n"
-        f"手续费：{_fmt_money(fee_usd)} 美元 / { _fmt_money(fee_cny)} 元\n"
-        f"合计：{_fmt_money(total_usd)} 美元 / { _fmt_money(total_cny)} 元\n"
-        f"使用汇率及时间：{_fmt_money(Decimal(per_usd))}（挂牌时间：{time_str}，来源：{BOC_URL}）\n"
-        f"总额换算汇率：{_fmt_money(total_rate)}"
+        f"{label}：{_fmt_money(fx)} {unit}\n"
+        f"人民币：{fmt_units(cny_no_fee)} 元（不含手续费）\n"
+        f"手续费：{fmt_units(fee_fx)} {unit} / {fmt_units(fee_cny)} 元\n"
+        f"合计：{fmt_units(total_fx)} {unit} / {fmt_units(total_cny)} 元\n"
+        f"使用汇率及时间：{_fmt_money(Decimal(per_unit))}（挂牌时间：{time_str}，来源：{BOC_URL}）\n"
+        f"总额换算汇率：{fmt_units(total_rate)}"
     )
+    if is_rate_stale():
+        msg_b += "\n（缓存牌价，后台刷新中）"
     await update.message.reply_text(msg_b)
 
 # ---------- FastAPI + webhook ----------
 ptb_app = None
 app = FastAPI()
+_loop_monitor = LoopMonitor(LOOP_LAG_INTERVAL, LOOP_SLOW_THRESHOLD, observe=LOOP_LAG_SECONDS.observe)
+
+async def _open_history():
+    global _history
+    if not RATE_HISTORY_DB:
+        return
+    try:
+        _history = await asyncio.to_thread(RateHistory, RATE_HISTORY_DB)
+    except Exception as e:
+        print("牌价历史库打开失败：", e)
+
+async def _close_history():
+    global _history
+    if _history is not None:
+        await asyncio.to_thread(_history.close)
+        _history = None
+
+@contextmanager
+def _startup_step(name: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        _startup["lifespan_steps"][name] = _ms_since(t0)
+
+def startup_report() -> dict:
+    lazy = dict(_startup["lazy_imports"])
+    if boc_parser.lxml_import_seconds is not None:
+        lazy["lxml_ms"] = round(boc_parser.lxml_import_seconds * 1000, 1)
+    return {**_startup, "lifespan_steps": dict(_startup["lifespan_steps"]), "lazy_imports": lazy}
 
 @asynccontextmanager
 async def lifespan(app_fastapi: FastAPI):
+    t0 = time.perf_counter()
+    # 进程级共享连接池：启动时创建，退出时关闭
+    with _startup_step("http_client"):
+        client = _build_http_client()
+        set_http_client(client)
+    if LOOP_MONITOR:
+        _loop_monitor.start()
+    with _startup_step("state_backend"):
+        await _open_state_backend()
+    with _startup_step("history"):
+        await _open_history()
+    tasks = [asyncio.create_task(_state_sweeper_loop())]
+    if _history is not None:
+        tasks.append(asyncio.create_task(_history_flush_loop()))
+    if RATE_BACKGROUND_REFRESH:
+        tasks.append(asyncio.create_task(_rate_refresher_loop()))
+    try:
+        t_bot = time.perf_counter()
+        async with _bot_lifespan():
+            _startup["lifespan_steps"]["bot"] = _ms_since(t_bot)
+            _startup["lifespan_ms"] = _ms_since(t0)
+            steps = " / ".join(f"{k} {v}" for k, v in _startup["lifespan_steps"].items())
+            print(f"启动耗时：import {_startup['import_ms']}ms，lifespan {_startup['lifespan_ms']}ms（{steps}）")
+            yield
+    finally:
+        for task in tasks:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await _close_history()
+        await _close_state_backend()
+        set_http_client(None)
+        await client.aclose()
+        _shutdown_bocfx_executor()
+        await _loop_monitor.stop()
+
+def _timed(command: str, handler):
+    """记录处理耗时到 HANDLER_SECONDS{command=...}"""
+    hist = HANDLER_SECONDS.labels(command)
+
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        t0 = time.perf_counter()
+        try:
+            return await handler(update, context)
+        finally:
+            hist.observe(time.perf_counter() - t0)
+    wrapper.__name__ = handler.__name__
+    return wrapper
+
+class _TimedHTTPXRequest(HTTPXRequest):
+    """出站 Bot API 请求计时（按方法名）"""
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        t0 = time.perf_counter()
+        try:
+            return await super().do_request(url, method, request_data, read_timeout,
+                                            write_timeout, connect_timeout, pool_timeout)
+        finally:
+            TELEGRAM_SEND_SECONDS.labels(url.rsplit("/", 1)[-1]).observe(time.perf_counter() - t0)
+
+# ---------- 消息路由（单次分类，每条更新只执行一个处理函数） ----------
+ROUTE_COMMANDS = ("rate", "history", "convert")  # 带 bot_command 实体的命令（不区分大小写）
+_RE_RATE_ALIAS = re.compile(r"^/?\s*汇率(\s.*)?$")
+_RE_CONVERT_ALIAS = re.compile(r"^兑换\s*\S+.*$")
+
+def _command_length(message) -> int:
+    """消息以 bot_command 实体开头时返回其长度（含 /），否则 0"""
+    entities = message.entities
+    if entities and entities[0].type == MessageEntity.BOT_COMMAND and entities[0].offset == 0:
+        return entities[0].length
+    return 0
+
+def _classify_message(text: str, command_len: int, bot_username: str | None) -> tuple[str | None, list[str] | None]:
+    """
+    返回 (路由名, 命令参数)；路由名为 None 表示无需处理。
+    优先级与原 Handler 注册顺序一致：命令 > “汇率”别名 > “兑换”别名 > 自由文本（费率输入等）。
+    """
+    if command_len:
+        name, _, target = text[1:command_len].partition("@")
+        # 发给群里其他 bot 的命令不匹配（与 CommandHandler 一致），继续按别名判断
+        mine = not target or not bot_username or target.lower() == bot_username.lower()
+        if mine and name.lower() in ROUTE_COMMANDS:
+            return name.lower(), text.split()[1:]
+    if "汇率" in text and _RE_RATE_ALIAS.match(text):
+        return "rate_alias", None
+    if text.startswith("兑换") and _RE_CONVERT_ALIAS.match(text):
+        return "convert_alias", None
+    # 其他命令（/start 等）不作为自由文本处理
+    return (None if command_len else "text"), None
+
+MESSAGE_ROUTES = {
+    "rate": cmd_rate,
+    "history": cmd_history,
+    "convert": cmd_convert,
+    "rate_alias": alias_rate,
+    "convert_alias": alias_convert,
+    "text": handle_text,
+}
+
+def _make_router(routes: dict):
+    async def route_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        message = update.message
+        name, args = _classify_message(message.text, _command_length(message), context.bot.username)
+        if name is None:
+            return
+        if args is not None:
+            context.args = args
+        await routes[name](update, context)
+    return route_message
+
+def _register_handlers(application: Application) -> None:
+    # 单个 MessageHandler：分类一次后直接调用对应处理函数（各自仍按命令名记录耗时）
+    routes = {name: _timed(name, handler) for name, handler in MESSAGE_ROUTES.items()}
+    application.add_handler(MessageHandler(filters.UpdateType.MESSAGE & filters.TEXT, _make_router(routes)))
+
+@asynccontextmanager
+async def _bot_lifespan():
     global ptb_app
     if not TOKEN:
         print("!! 未检测到 TELEGRAM_TOKEN，Bot 不启动。")
         yield
         return
 
-    ptb_app = Application.builder().updater(None).token(TOKEN).build()
-
-    # /rate + 中文别名
-    ptb_app.add_handler(CommandHandler("rate", cmd_rate))
-    ptb_app.add_handler(MessageHandler(filters.TEXT & filters.Regex(r"^/?\s*汇率\s*$"), alias_rate))
-
-    # /convert + 中文“兑换”
-    ptb_app.add_handler(CommandHandler("convert", cmd_convert))
-    ptb_app.add_handler(MessageHandler(filters.TEXT & filters.Regex(r"^兑换\s*\S+.*$"), alias_convert))
-
-    # 费率输入/取消/沿用的自由文本
-    ptb_app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
+    ptb_app = (
+        Application.builder().updater(None).token(TOKEN)
+        .base_url(f"{TELEGRAM_API_URL}/bot").base_file_url(f"{TELEGRAM_API_URL}/file/bot")
+        .request(_TimedHTTPXRequest(connection_pool_size=256))
+        .build()
+    )
+    _register_handlers(ptb_app)
 
+    webhook_task = None
     if BASE_URL:
         webhook_url = f"{BASE_URL.rstrip('/')}/webhook/{quote(TOKEN, safe='')}"
-        try:
-            await ptb_app.bot.set_webhook(webhook_url)
-            print("Webhook:", webhook_url)
-        except Exception as e:
-            print("Webhook 设置失败：", e)
+        # 重新部署时 webhook 通常已指向本服务，无需阻塞启动等待注册
+        webhook_task = asyncio.create_task(_ensure_webhook(webhook_url))
     else:
         print("警告：未设置 BASE_URL，未注册 webhook。")
 
     async with ptb_app:
         await ptb_app.start()
-        yield
-        await ptb_app.stop()
+        await _start_update_workers()
+        try:
+            yield
+        finally:
+            if webhook_task is not None and not webhook_task.done():
+                webhook_task.cancel()
+            await _stop_update_workers()
+            await ptb_app.stop()
+
+def _webhook_up_to_date(info, webhook_url: str) -> bool:
+    return (
+        info.url == webhook_url
+        and sorted(info.allowed_updates or ()) == sorted(WEBHOOK_ALLOWED_UPDATES)
+        and info.max_connections == WEBHOOK_MAX_CONNECTIONS
+    )
+
+async def _ensure_webhook(webhook_url: str):
+    """getWebhookInfo 与期望一致则跳过 set_webhook；查询失败时直接注册"""
+    try:
+        info = await ptb_app.bot.get_webhook_info()
+    except Exception as e:
+        print("DEBUG getWebhookInfo error:", e)
+        info = None
+    if info is not None and _webhook_up_to_date(info, webhook_url):
+        _startup["webhook"] = "unchanged"
+        if info.last_error_message:
+            print("Webhook 最近错误：", info.last_error_message)
+        print("Webhook 未变化，跳过注册：", webhook_url)
+        return
+    try:
+        await ptb_app.bot.set_webhook(webhook_url, allowed_updates=WEBHOOK_ALLOWED_UPDATES,
+                                      max_connections=WEBHOOK_MAX_CONNECTIONS)
+        _startup["webhook"] = "set"
+        print("Webhook:", webhook_url)
+    except Exception as e:
+        _startup["webhook"] = "failed"
+        print("Webhook 设置失败：", e)
+
+# ---------- 更新队列（webhook 快速应答，按 chat 串行 / 跨 chat 并发） ----------
+_scheduler = None   # ChatScheduler | None
+_webhook_stats = {"accepted": 0, "rejected": 0, "prefiltered": 0, "bad_request": 0}
+_webhook_latency = deque(maxlen=2048)  # 最近的 webhook 响应耗时（秒）
+
+def _update_key(update: Update):
+    """调度键：同一 chat 的更新串行；无 chat 的更新各自独立"""
+    chat = update.effective_chat
+    return chat.id if chat is not None else ("update", update.update_id)
+
+async def _start_update_workers():
+    global _scheduler
+    _scheduler = ChatScheduler(ptb_app.process_update, UPDATE_WORKERS)
+
+async def _stop_update_workers():
+    global _scheduler
+    if _scheduler is None:
+        return
+    try:
+        await asyncio.wait_for(_scheduler.join(), UPDATE_DRAIN_TIMEOUT)
+    except asyncio.TimeoutError:
+        print(f"警告：退出时仍有 {_scheduler.pending} 条更新未处理。")
+    await _scheduler.close()
+    _scheduler = None
+
+def _percentile(sorted_vals: list[float], q: float) -> float | None:
+    if not sorted_vals:
+        return None
+    return sorted_vals[min(int(q * len(sorted_vals)), len(sorted_vals) - 1)]
+
+def webhook_stats() -> dict:
+    """webhook 入队/拒绝/处理计数、队列深度与响应耗时 p50/p99（毫秒）"""
+    lat = sorted(_webhook_latency)
+    p50, p99 = _percentile(lat, 0.50), _percentile(lat, 0.99)
+    return {
+        **_webhook_stats,
+        "prefiltered_by": dict(_prefilter_stats),
+        **(_scheduler.stats if _scheduler is not None else {}),
+        "queue_depth": _scheduler.pending if _scheduler is not None else 0,
+        "active_chats": _scheduler.active_chats if _scheduler is not None else 0,
+        "latency_ms_p50": round(p50 * 1000, 3) if p50 is not None else None,
+        "latency_ms_p99": round(p99 * 1000, 3) if p99 is not None else None,
+    }
 
 app = FastAPI(lifespan=lifespan)
 
+# ---------- webhook 预过滤（基于原始 JSON，不构造 PTB 对象） ----------
+# 与消息路由保持一致：只有这些命令 / 前缀，或有待费率会话的 chat 才需要处理
+PREFILTER_COMMANDS = set(ROUTE_COMMANDS)
+PREFILTER_PREFIXES = ("汇率", "兑换")
+_prefilter_stats = {"not_message": 0, "no_text": 0, "idle_chat": 0}
+
+async def _prefilter_reason(data) -> str | None:
+    """返回可直接丢弃的原因；None 表示交给 PTB 处理"""
+    message = data.get("message") if isinstance(data, dict) else None
+    chat = message.get("chat") if isinstance(message, dict) else None
+    chat_id = chat.get("id") if isinstance(chat, dict) else None
+    if not isinstance(chat_id, int):
+        # 缺少 chat 对象或 chat.id 的不是有效消息（类型不对时继续处理会抛异常、返回 500）
+        return "not_message"
+    text = message.get("text")
+    if not isinstance(text, str) or not text.strip():
+        return "no_text"
+    t = text.lstrip()
+    if t.startswith("/"):
+        t = t[1:].lstrip()
+        name = t.split(None, 1)[0].split("@", 1)[0].lower() if t else ""
+        if name in PREFILTER_COMMANDS:
+            return None
+    if t.startswith(PREFILTER_PREFIXES):
+        return None
+    # 同一 chat 仍有未处理的更新（如刚入队的“兑换”）时不能丢，否则后续费率回复会丢失
+    if _scheduler.has_pending(chat_id) or await _state.get("pending_fee", chat_id) is not None:
+        return None
+    return "idle_chat"
+
 @app.post("/webhook/{token:path}")
 async def telegram_webhook(token: str, request: Request):
+    started = time.perf_counter()
     if not TOKEN or unquote(token) != TOKEN:
         return Response(status_code=HTTPStatus.FORBIDDEN)
-    data = await request.json()
+    if _scheduler is None:
+        return Response(status_code=HTTPStatus.SERVICE_UNAVAILABLE)
+    try:
+        data = _json_loads(await request.body())
+    except ValueError:
+        _webhook_stats["bad_request"] += 1
+        return Response(status_code=HTTPStatus.BAD_REQUEST)
+    reason = await _prefilter_reason(data)
+    if reason is not None:
+        # 无关更新直接应答，不进入队列
+        _webhook_stats["prefiltered"] += 1
+        _prefilter_stats[reason] += 1
+        WEBHOOK_SECONDS.observe(time.perf_counter() - started)
+        return Response(status_code=HTTPStatus.OK)
+    if _scheduler.pending >= UPDATE_QUEUE_SIZE:
+        # 背压：让 Telegram 稍后重试
+        _webhook_stats["rejected"] += 1
+        return Response(status_code=HTTPStatus.TOO_MANY_REQUESTS, headers={"Retry-After": "1"})
     update = Update.de_json(data, ptb_app.bot)
-    await ptb_app.process_update(update)
+    _scheduler.submit(_update_key(update), update)
+    _webhook_stats["accepted"] += 1
+    elapsed = time.perf_counter() - started
+    _webhook_latency.append(elapsed)
+    WEBHOOK_SECONDS.observe(elapsed)
     return Response(status_code=HTTPStatus.OK)
 
 @app.get("/")
@@ -479,6 +1244,232 @@ async def env_probe():
         "BASE_URL": BASE_URL or None,
     }
 
+@app.get("/api/history")
+async def api_history(code: str = "USD", kind: str = "SE_ASK", window: str = "24h"):
+    """区间：window=24h / 30d；时点：window=2026-10-01 10:30"""
+    if _history is None:
+        return Response(status_code=HTTPStatus.SERVICE_UNAVAILABLE)
+    ccy = currency_code(code)
+    pt = price_type(kind)
+    result = await query_history(ccy, pt, window) if ccy and pt else None
+    if result is None:
+        return Response(status_code=HTTPStatus.BAD_REQUEST)
+    mode, data = result
+    points = [data] if mode == "at" and data is not None else (data if mode == "range" else [])
+    return {
+        "code": ccy,
+        "kind": pt,
+        "mode": mode,
+        "points": [
+            {"pub_time": ts.isoformat(), "raw_100": str(raw), "per_unit": str(raw / Decimal("100"))}
+            for ts, raw in points
+        ],
+    }
+
+# ---------- HTTP JSON API（与 bot 共用牌价缓存） ----------
+_QUOTE_FIELDS = ("cny_no_fee", "fee_cny", "fee_fx", "total_cny", "total_fx", "total_rate")
+
+def _rate_api_row(row) -> dict:
+    prices = {pt: row.price(pt) for pt in PRICE_TYPES}
+    return {
+        "name": row.name,
+        "pub_time": row.pub_time,
+        "raw_100": {pt: None if v is None else str(v) for pt, v in prices.items()},
+        "per_unit": {pt: None if v is None else str(v / Decimal("100")) for pt, v in prices.items()},
+    }
+
+def _rate_api_body(code: str) -> tuple[bytes, str] | None:
+    """当前缓存快照的 JSON 字节与 ETag；code 为空时为整表。快照不变时直接复用，不再序列化"""
+    snapshot = _rate_cache["snapshot"]
+    key = (snapshot, _rate_cache["per_usd"], _rate_cache["pub_time"])
+    if _api_rate_bodies["key"] != key:
+        _api_rate_bodies["key"] = key
+        _api_rate_bodies["bodies"] = {}
+    bodies = _api_rate_bodies["bodies"]
+    cached = bodies.get(code)
+    if cached is not None:
+        return cached
+
+    if snapshot is None:
+        # bocfx 兜底：只有美元现汇卖出价
+        rows = {"USD": {
+            "name": CURRENCY_NAMES["USD"],
+            "pub_time": _rate_cache["pub_time"],
+            "raw_100": {"SE_ASK": str(_rate_cache["raw_100"])},
+            "per_unit": {"SE_ASK": str(_rate_cache["per_usd"])},
+        }}
+        if code:
+            rows = {code: rows[code]} if code in rows else None
+    elif code:
+        row = snapshot.get(code)
+        rows = {code: _rate_api_row(row)} if row is not None else None
+    else:
+        rows = {row.code: _rate_api_row(row) for row in snapshot}
+    if rows is None:
+        return None
+    body = _json_dumps({
+        "source": BOC_URL,
+        "pub_time": snapshot.pub_time if snapshot is not None else _rate_cache["pub_time"],
+        "rates": rows,
+    })
+    cached = bodies[code] = (body, f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"')
+    _api_stats["rate_serialized"] += 1
+    return cached
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(t.strip().removeprefix("W/") == etag for t in if_none_match.split(","))
+
+@app.get("/api/rate")
+async def api_rate(request: Request, code: str = ""):
+    """
+    当前牌价（整表，或 code=EUR / code=欧元 单一币种）。
+    响应体每个快照只序列化一次，之后直接返回缓存字节；带 ETag（If-None-Match 命中返回 304）
+    与 Cache-Control（max-age 为缓存剩余有效期）。
+    """
+    _api_stats["rate"] += 1
+    ccy = ""
+    if code:
+        ccy = currency_code(code)
+        if ccy is None:
+            return Response(status_code=HTTPStatus.BAD_REQUEST)
+    per_usd, _, _ = await get_usd_per_usd_with_cache()
+    if per_usd is None:
+        return Response(status_code=HTTPStatus.SERVICE_UNAVAILABLE)
+    cached = _rate_api_body(ccy)
+    if cached is None:
+        return Response(status_code=HTTPStatus.NOT_FOUND)
+    body, etag = cached
+    age = _rate_age_seconds() or 0.0
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={max(int(RATE_TTL - age), 0)}"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        _api_stats["rate_not_modified"] += 1
+        return Response(status_code=HTTPStatus.NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@app.get("/api/convert")
+async def api_convert(amount: str, code: str = "USD", fee: str = "0", kind: str = "SE_ASK"):
+    """
+    外币 -> 人民币报价，计算同“兑换”：amount 支持 50万 / 1.2k / 1万,5万 / 1万~10万，
+    fee 为手续费百分比；各项为 4 位小数字符串
+    """
+    _api_stats["convert"] += 1
+    ccy = currency_code(code)
+    pt = price_type(kind)
+    fee_pct = _parse_percent_to_decimal(fee)
+    amounts = parse_amounts(amount, _parse_amount_any, CONVERT_MAX_AMOUNTS)
+    if ccy is None or pt is None or fee_pct is None or amounts is None or len(amounts) > CONVERT_MAX_AMOUNTS:
+        return Response(status_code=HTTPStatus.BAD_REQUEST)
+    per_unit, pub_time, _ = await get_rate_with_cache(ccy, pt)
+    if per_unit is None:
+        return Response(status_code=HTTPStatus.SERVICE_UNAVAILABLE)
+    return {
+        "code": ccy,
+        "kind": pt,
+        "per_unit": str(per_unit),
+        "fee_pct": str(fee_pct),
+        "pub_time": pub_time,
+        "stale": is_rate_stale(),
+        "quotes": [
+            {"amount": str(a), **{k: str(to_decimal(v)) for k, v in zip(_QUOTE_FIELDS, q)}}
+            for a, q in zip(amounts, quote_batch(amounts, per_unit, fee_pct))
+        ],
+    }
+
+@app.get("/__stats")
+async def stats_probe():
+    return {
+        "rate": get_usd_per_usd_with_cache.stats,
+        "api": _api_stats,
+        "boc_fetch": fetch_boc_official_usd_se_ask_httpx.stats,
+        "state": await state_stats(),
+        "webhook": webhook_stats(),
+        "loop": {k: v for k, v in _loop_monitor.snapshot().items() if k != "recent"},
+        "startup": startup_report(),
+    }
+
+# ---------- 管理接口（ADMIN_TOKEN 鉴权；未设置时返回 404） ----------
+def _admin_authorized(request: Request) -> bool:
+    auth = request.headers.get("authorization", "")
+    given = auth[7:] if auth[:7].lower() == "bearer " else request.headers.get("x-admin-token", "")
+    return bool(given) and hmac.compare_digest(given.encode(), ADMIN_TOKEN.encode())
+
+def _admin_denied(request: Request) -> Response | None:
+    """未开启管理接口返回 404，鉴权失败返回 403；通过返回 None"""
+    if not ADMIN_TOKEN:
+        return Response(status_code=HTTPStatus.NOT_FOUND)
+    if not _admin_authorized(request):
+        return Response(status_code=HTTPStatus.FORBIDDEN)
+    return None
+
+@app.get("/__loop")
+async def loop_probe(request: Request):
+    """事件循环延迟与最近的慢回调（含阻塞时事件循环线程的调用栈，带文件路径，故需鉴权）"""
+    denied = _admin_denied(request)
+    if denied is not None:
+        return denied
+    return _loop_monitor.snapshot()
+
+# ---------- 按需采样分析 ----------
+_profile_lock = asyncio.Lock()
+
+@app.get("/__profile")
+async def profile_probe(request: Request, seconds: float = 10, hz: float = 200, scope: str = "loop"):
+    """采样 seconds 秒，返回折叠栈文本（flamegraph.pl / speedscope 可直接读取）
+
+    scope=loop 只采事件循环线程（handler、抓取、解析都在这里）；scope=all 采全部线程（含 bocfx 线程池）
+    """
+    denied = _admin_denied(request)
+    if denied is not None:
+        return denied
+    if scope not in {"loop", "all"} or not (seconds > 0 and hz > 0):
+        return Response(status_code=HTTPStatus.BAD_REQUEST)
+    if _profile_lock.locked():
+        return Response(status_code=HTTPStatus.CONFLICT)
+    async with _profile_lock:
+        seconds = min(seconds, PROFILE_MAX_SECONDS)
+        interval = 1 / min(hz, 1000)
+        thread_ids = {threading.get_ident()} if scope == "loop" else None
+        stacks, rounds = await asyncio.to_thread(sampling_profiler.sample, seconds, interval, thread_ids)
+    return Response(
+        content=sampling_profiler.collapse(stacks),
+        media_type="text/plain; charset=utf-8",
+        headers={"X-Profile-Samples": str(rounds), "X-Profile-Seconds": f"{seconds:g}"},
+    )
+
+RATE_AGE_SECONDS = metrics.Gauge("bocbot_rate_age_seconds", "当前美元牌价缓存距上次刷新的秒数",
+                                 fn=_rate_age_seconds)
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    state = await _state.stats()
+    PENDING_SESSIONS.set(state.get("pending_fee", {}).get("size", 0))
+    sched = _scheduler.stats if _scheduler is not None else {}
+    body = metrics.render(
+        metrics.render_counters("bocbot_rate_cache_total", "牌价缓存命中/未命中/单飞/兜底次数", _rate_fetch_stats)
+        + metrics.render_counters("bocbot_boc_fetch_total", "BOC 抓取请求/304/跳过解析/解析失败次数",
+                                  {k: v for k, v in _boc_fetch_stats.items() if k != "bytes"})
+        + metrics.render_value("bocbot_boc_fetch_bytes_total", "BOC 抓取下载字节数", _boc_fetch_stats["bytes"])
+        + metrics.render_value("bocbot_event_loop_slow_callbacks_total", "阻塞事件循环超过阈值的次数",
+                               _loop_monitor.stats["slow_callbacks"])
+        + metrics.render_counters("bocbot_webhook_total", "webhook 入队/拒绝/预过滤及更新处理次数", {**_webhook_stats, **sched})
+        + metrics.render_counters("bocbot_webhook_prefiltered_total", "预过滤直接应答的更新数（按原因）",
+                                  _prefilter_stats, label="reason")
+        + metrics.render_counters("bocbot_api_total", "HTTP JSON API 请求/304/序列化次数", _api_stats)
+        + metrics.render_counters("bocbot_state_entries", "会话状态各命名空间的条目数（含未清理的过期条目）",
+                                  {ns: st["size"] for ns, st in state.items()}, label="namespace", kind="gauge")
+        + metrics.render_counters("bocbot_state_evictions_total", "会话状态超出容量被淘汰的条目数",
+                                  {ns: st["evictions"] for ns, st in state.items() if "evictions" in st},
+                                  label="namespace")
+        + metrics.render_counters("bocbot_state_expirations_total", "会话状态过期清理的条目数（仅内存后端）",
+                                  {ns: st["expirations"] for ns, st in state.items() if "expirations" in st},
+                                  label="namespace")
+    )
+    return Response(content=body, media_type="text/plain; version=0.0.4; charset=utf-8")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=PORT, log_level="info")
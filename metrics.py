@@ -0,0 +1,124 @@
+# metrics.py
+"""
+极简 Prometheus 指标（文本格式 0.0.4），不依赖 prometheus_client。
+
+直方图的桶边界在创建时固定，observe() 只做一次二分查找和三次整数/浮点累加；
+带标签的子指标首次使用时创建并缓存，之后不再分配对象。
+计数类指标沿用各模块已有的 stats 字典，由 render_counters() 在抓取时输出。
+"""
+from bisect import bisect_left
+
+# 秒；覆盖亚毫秒的内存读到十几秒的上游抓取
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+REGISTRY = []
+
+
+def _fmt(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_str(names, values) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # 最后一个为 +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (),
+                 buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.bounds = tuple(sorted(buckets))
+        self._children = {}
+        if not self.labelnames:
+            self._children[()] = _HistogramChild(self.bounds)
+        REGISTRY.append(self)
+
+    def labels(self, *values) -> _HistogramChild:
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = _HistogramChild(self.bounds)
+        return child
+
+    def observe(self, value: float) -> None:
+        self._children[()].observe(value)
+
+    def render(self) -> list[str]:
+        out = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for values, child in self._children.items():
+            cum = 0
+            for bound, n in zip((*self.bounds, float("inf")), child.counts):
+                cum += n
+                le = _label_str((*self.labelnames, "le"), (*values, _fmt(bound)))
+                out.append(f"{self.name}_bucket{le} {cum}")
+            base = _label_str(self.labelnames, values)
+            out.append(f"{self.name}_sum{base} {_fmt(child.sum)}")
+            out.append(f"{self.name}_count{base} {child.count}")
+        return out
+
+
+class Gauge:
+    """抓取时取值：set() 直接赋值，或传入 fn 在 render 时调用"""
+
+    def __init__(self, name: str, documentation: str, fn=None):
+        self.name = name
+        self.documentation = documentation
+        self.value = 0.0
+        self._fn = fn
+        REGISTRY.append(self)
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def render(self) -> list[str]:
+        value = self._fn() if self._fn is not None else self.value
+        if value is None:
+            value = float("nan")
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge",
+                f"{self.name} {_fmt(float(value)).replace('nan', 'NaN')}"]
+
+
+def render_counters(name: str, documentation: str, counts: dict, label: str = "kind",
+                    kind: str = "counter") -> list[str]:
+    """把 {"hits": 3, ...} 形式的计数字典输出为一个带标签的 counter（kind="gauge" 时为 gauge）"""
+    out = [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+    for key, value in counts.items():
+        out.append(f"{name}{_label_str((label,), (key,))} {value}")
+    return out
+
+
+def render_value(name: str, documentation: str, value, kind: str = "counter") -> list[str]:
+    """输出一个无标签的单值指标"""
+    return [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}", f"{name} {_fmt(value)}"]
+
+
+def render(extra: list[str] | None = None) -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    if extra:
+        lines.extend(extra)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,59 @@
+# quote_engine.py
+"""
+报价计算的定点整数实现：结果以 1e-4 为单位的 int 表示（12345.6789 元 -> 123456789）。
+
+各项依次为：不含手续费的人民币、手续费（人民币 / 外币）、合计（人民币 / 外币）、总额换算汇率，
+每一步都按 ROUND_HALF_UP 保留 4 位小数，与原先逐步 quantize 的 Decimal 算法逐项一致
+（该实现保留在 bench/run.py 的 legacy_compute_quote，tests/test_quote_engine.py 对照校验）。
+只做整数乘除：输入的 Decimal 先精确转成分数（as_integer_ratio），
+中间结果按“分子 / 分母”一次性舍入，不构造任何中间 Decimal。
+"""
+from decimal import Decimal
+
+SCALE = 10000  # 1e-4 单位
+
+
+def quote_units(amount: Decimal, per_unit: Decimal, fee_pct: Decimal) -> tuple[int, int, int, int, int, int]:
+    """
+    amount：外币金额（> 0）；per_unit：每 1 单位外币的人民币价（> 0）；fee_pct：手续费百分比（>= 0，2.3 表示 2.3%）。
+    返回 1e-4 单位的 (cny_no_fee, fee_cny, fee_fx, total_cny, total_fx, total_rate)
+    """
+    return quote_ratios(amount.as_integer_ratio(), per_unit.as_integer_ratio(), fee_pct.as_integer_ratio())
+
+
+def quote_ratios(amount: tuple[int, int], per_unit: tuple[int, int],
+                 fee_pct: tuple[int, int]) -> tuple[int, int, int, int, int, int]:
+    """同 quote_units，参数为 (分子, 分母)；同一牌价 / 费率批量计算时只需转换一次"""
+    an, ad = amount
+    pn, pd = per_unit
+    fn, fd = fee_pct
+    # ROUND_HALF_UP：非负 n / d 取整即 (2n + d) // 2d；SCALE = 10000 直接写成字面量
+    d = ad * pd
+    cny = (20000 * an * pn + d) // (2 * d)                           # fx * per_unit
+    fee_cny = (2 * cny * fn + 100 * fd) // (200 * fd) if fn else 0   # cny * fee_pct / 100
+    fee_fx = (2 * fee_cny * pd + pn) // (2 * pn) if fee_cny else 0   # fee_cny / per_unit
+    total_cny = cny + fee_cny
+    if ad == 1:
+        total_fx = 10000 * an + fee_fx                               # fx 为整数，无需舍入
+    else:
+        total_fx = (20000 * an + 2 * fee_fx * ad + ad) // (2 * ad)  # fx + fee_fx
+    total_rate = (2 * total_cny * ad + an) // (2 * an)               # total_cny / fx
+    return cny, fee_cny, fee_fx, total_cny, total_fx, total_rate
+
+
+def quote_batch(amounts: list[Decimal], per_unit: Decimal,
+                fee_pct: Decimal) -> list[tuple[int, int, int, int, int, int]]:
+    """同一牌价 / 费率下的多个金额：牌价与费率只转换一次，逐项结果同 quote_units"""
+    p = per_unit.as_integer_ratio()
+    f = fee_pct.as_integer_ratio()
+    return [quote_ratios(a.as_integer_ratio(), p, f) for a in amounts]
+
+
+def to_decimal(units: int) -> Decimal:
+    """1e-4 单位整数 -> 4 位小数的 Decimal"""
+    return Decimal(units).scaleb(-4)
+
+
+def fmt_units(units: int) -> str:
+    """等价于 _fmt_money(to_decimal(units))：千分位 + 4 位小数（units >= 0）"""
+    return f"{units // SCALE:,}.{units % SCALE:04d}"
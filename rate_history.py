@@ -0,0 +1,135 @@
+# rate_history.py
+"""
+牌价历史：SQLite（WAL）追加存储。
+
+- 按 (币种, 发布时间) 去重，主键即索引（WITHOUT ROWID），区间/时点查询为 O(log n)
+- 刷新路径只把快照放入内存缓冲，批量写入由 flush() 在线程中完成
+- 价格以字符串保存，读出仍为 Decimal（不经 float）
+"""
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from boc_parser import PRICE_TYPES, RateSnapshot
+
+CN_TZ = timezone(timedelta(hours=8))
+_PUB_TIME_FORMATS = ("%Y.%m.%d %H:%M:%S", "%Y-%m-%d %H:%M:%S", "%Y/%m/%d %H:%M:%S", "%Y.%m.%d %H:%M")
+_PRICE_COLUMNS = [pt.lower() for pt in PRICE_TYPES]
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS rate_history (
+    code TEXT NOT NULL,
+    pub_ts INTEGER NOT NULL,
+    {", ".join(f"{c} TEXT" for c in _PRICE_COLUMNS)},
+    pub_time TEXT,
+    PRIMARY KEY (code, pub_ts)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_rate_history_ts ON rate_history (pub_ts);
+"""
+
+
+def parse_pub_time(text: str | None) -> datetime | None:
+    """'2026.10.01 10:30:00'（北京时间）-> aware datetime；无法识别返回 None"""
+    if not text:
+        return None
+    for fmt in _PUB_TIME_FORMATS:
+        try:
+            return datetime.strptime(text.strip(), fmt).replace(tzinfo=CN_TZ)
+        except ValueError:
+            continue
+    return None
+
+
+class RateHistory:
+    """牌价历史存储；线程安全，读写均为阻塞调用（在事件循环中请配合 asyncio.to_thread）"""
+
+    def __init__(self, path: str, batch_size: int = 256):
+        self.path = path
+        self.batch_size = batch_size
+        self._lock = threading.Lock()       # 保护连接
+        self._buf_lock = threading.Lock()   # 仅保护写缓冲，不会因落盘阻塞调用方
+        self._buffer = []
+        self._last_snapshot = None
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+    # ---------- 写入 ----------
+    def record(self, snapshot: RateSnapshot | None, fetched_at: datetime | None = None) -> bool:
+        """
+        把快照放入写缓冲（不落盘）；同一快照对象只记录一次。
+        缺少可解析的发布时间时用 fetched_at 代替。缓冲满 batch_size 时返回 True，提示调用方 flush。
+        """
+        if snapshot is None or snapshot is self._last_snapshot:
+            return False
+        self._last_snapshot = snapshot
+        rows = []
+        for row in snapshot:
+            ts = parse_pub_time(row.pub_time) or parse_pub_time(snapshot.pub_time) or fetched_at
+            if ts is None:
+                continue
+            prices = [None if p is None else str(p) for p in row[2:2 + len(_PRICE_COLUMNS)]]
+            rows.append((row.code, int(ts.timestamp()), *prices, row.pub_time))
+        with self._buf_lock:
+            self._buffer.extend(rows)
+            return len(self._buffer) >= self.batch_size
+
+    def flush(self) -> int:
+        """把缓冲批量写入（重复的发布时间被忽略），返回本次提交的行数"""
+        with self._buf_lock:
+            batch, self._buffer = self._buffer, []
+        if not batch:
+            return 0
+        with self._lock:
+            cols = ["code", "pub_ts", *_PRICE_COLUMNS, "pub_time"]
+            sql = (f"INSERT OR IGNORE INTO rate_history ({', '.join(cols)}) "
+                   f"VALUES ({', '.join('?' * len(cols))})")
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(sql, batch)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            return len(batch)
+
+    # ---------- 查询 ----------
+    def range(self, code: str, start: datetime, end: datetime | None = None,
+              price_kind: str = "SE_ASK") -> list[tuple[datetime, Decimal]]:
+        """[start, end] 区间内的 (发布时间, 每100外币价)，按时间升序"""
+        col = _price_column(price_kind)
+        end_ts = int(end.timestamp()) if end is not None else 2 ** 62
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT pub_ts, {col} FROM rate_history "
+                f"WHERE code = ? AND pub_ts BETWEEN ? AND ? AND {col} IS NOT NULL ORDER BY pub_ts",
+                (code, int(start.timestamp()), end_ts),
+            ).fetchall()
+        return [(datetime.fromtimestamp(ts, CN_TZ), Decimal(p)) for ts, p in rows]
+
+    def at(self, code: str, when: datetime,
+           price_kind: str = "SE_ASK") -> tuple[datetime, Decimal] | None:
+        """when 时刻生效的牌价（不晚于 when 的最近一次发布）；没有返回 None"""
+        col = _price_column(price_kind)
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT pub_ts, {col} FROM rate_history "
+                f"WHERE code = ? AND pub_ts <= ? AND {col} IS NOT NULL ORDER BY pub_ts DESC LIMIT 1",
+                (code, int(when.timestamp())),
+            ).fetchone()
+        if row is None:
+            return None
+        return datetime.fromtimestamp(row[0], CN_TZ), Decimal(row[1])
+
+
+def _price_column(price_kind: str) -> str:
+    if price_kind not in PRICE_TYPES:
+        raise ValueError(f"unknown price type: {price_kind}")
+    return price_kind.lower()
@@ -0,0 +1,213 @@
+# state_backend.py
+"""
+会话状态 / 牌价快照的存储后端。
+
+- MemoryBackend：进程内（TTLStore，按命名空间分别限容），单进程默认
+- SqliteBackend：SQLite（WAL）共享文件，多个 uvicorn worker / 同机多副本共享同一份状态；
+  同样按命名空间限容，超出时删除最早过期的行
+
+值以 pickle 序列化（仅用于本服务自己写入的本地文件，勿指向不可信来源）。
+过期时间使用墙钟时间，便于跨进程比较。
+"""
+import asyncio
+import pickle
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from ttl_store import TTLStore
+
+
+class StateBackend(ABC):
+    """后端接口：按 (namespace, key) 存取，带 TTL；get / set / pop 未实现的子类在实例化时即报错"""
+    shared = False  # 是否跨进程共享（决定是否需要回源读取其他 worker 写入的数据）
+
+    @abstractmethod
+    async def get(self, namespace: str, key, default=None):
+        ...
+
+    @abstractmethod
+    async def set(self, namespace: str, key, value, ttl: float | None = None) -> None:
+        ...
+
+    @abstractmethod
+    async def pop(self, namespace: str, key, default=None):
+        ...
+
+    async def sweep(self) -> int:
+        """清理过期数据，返回清理数量"""
+        return 0
+
+    async def stats(self) -> dict:
+        return {}
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryBackend(StateBackend):
+    def __init__(self, namespaces: dict[str, tuple[int, float]], default_capacity: int = 10000,
+                 default_ttl: float = 3600):
+        """namespaces: 命名空间 -> (容量, 默认 TTL 秒)；未登记的命名空间使用默认值"""
+        self._default = (default_capacity, default_ttl)
+        self._stores = {ns: TTLStore(cap, ttl) for ns, (cap, ttl) in namespaces.items()}
+
+    def store(self, namespace: str) -> TTLStore:
+        st = self._stores.get(namespace)
+        if st is None:
+            st = self._stores[namespace] = TTLStore(*self._default)
+        return st
+
+    async def get(self, namespace, key, default=None):
+        return self.store(namespace).get(key, default)
+
+    async def set(self, namespace, key, value, ttl=None):
+        self.store(namespace).set(key, value, ttl)
+
+    async def pop(self, namespace, key, default=None):
+        return self.store(namespace).pop(key, default)
+
+    async def sweep(self):
+        return sum(st.sweep() for st in self._stores.values())
+
+    async def stats(self):
+        return {ns: {"size": len(st), **st.stats} for ns, st in self._stores.items()}
+
+
+class SqliteBackend(StateBackend):
+    shared = True
+
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS kv (
+        ns TEXT NOT NULL,
+        key TEXT NOT NULL,
+        value BLOB NOT NULL,
+        expires_at REAL NOT NULL,
+        PRIMARY KEY (ns, key)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_kv_expires ON kv (expires_at);
+    CREATE INDEX IF NOT EXISTS idx_kv_ns_expires ON kv (ns, expires_at);
+    """
+    # 各命名空间的行数由触发器维护，set 时判断超容不必 COUNT(*) 全扫
+    _COUNT_SCHEMA = (
+        "CREATE TABLE kv_count (ns TEXT PRIMARY KEY, n INTEGER NOT NULL) WITHOUT ROWID",
+        "INSERT INTO kv_count (ns, n) SELECT ns, COUNT(*) FROM kv GROUP BY ns",
+        "CREATE TRIGGER kv_count_insert AFTER INSERT ON kv BEGIN "
+        "INSERT INTO kv_count (ns, n) VALUES (NEW.ns, 1) ON CONFLICT (ns) DO UPDATE SET n = n + 1; END",
+        "CREATE TRIGGER kv_count_delete AFTER DELETE ON kv BEGIN "
+        "UPDATE kv_count SET n = n - 1 WHERE ns = OLD.ns; END",
+    )
+
+    def __init__(self, path: str, namespaces: dict[str, tuple[int, float]] | None = None,
+                 default_capacity: int = 10000, default_ttl: float = 3600):
+        """namespaces: 命名空间 -> (容量, 默认 TTL 秒)，与 MemoryBackend 相同；未登记的命名空间使用默认值"""
+        for cap, _ in (namespaces or {}).values():
+            if cap <= 0:
+                raise ValueError("capacity must be positive")
+        self.path = path
+        self._namespaces = dict(namespaces or {})
+        self._default = (default_capacity, default_ttl)
+        self._evictions = {}  # 命名空间 -> 本进程 set 时因超容删除的行数
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self._SCHEMA)
+        self._transaction(self._create_counts)
+
+    def _create_counts(self):
+        """首次打开（或旧库升级）时建计数表并按现有数据初始化；多进程同时启动时只有一个执行"""
+        if self._conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'kv_count'").fetchone() is None:
+            for sql in self._COUNT_SCHEMA:
+                self._conn.execute(sql)
+
+    def _transaction(self, fn, *args):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(*args)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return result
+
+    # 阻塞实现（在线程中执行）
+    def _get(self, ns, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM kv WHERE ns = ? AND key = ? AND expires_at > ?",
+                (ns, str(key), time.time()),
+            ).fetchone()
+        return None if row is None else pickle.loads(row[0])
+
+    def _set(self, ns, key, value, ttl):
+        capacity, default_ttl = self._namespaces.get(ns, self._default)
+        ttl = default_ttl if ttl is None else ttl
+        blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        self._transaction(self._set_locked, ns, str(key), blob, time.time() + ttl, capacity)
+
+    def _set_locked(self, ns, key, blob, expires_at, capacity):
+        # 覆盖用 UPSERT 而不是 INSERT OR REPLACE：后者隐式删除旧行不触发删除触发器，计数会偏大
+        self._conn.execute(
+            "INSERT INTO kv (ns, key, value, expires_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (ns, key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+            (ns, key, blob, expires_at),
+        )
+        # 超出容量：删除该命名空间最早过期的行（已过期的排在最前）
+        excess = self._conn.execute("SELECT n FROM kv_count WHERE ns = ?", (ns,)).fetchone()[0] - capacity
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM kv WHERE ns = ? AND key IN "
+                "(SELECT key FROM kv WHERE ns = ? ORDER BY expires_at LIMIT ?)",
+                (ns, ns, excess),
+            )
+            self._evictions[ns] = self._evictions.get(ns, 0) + excess
+
+    def _pop(self, ns, key):
+        row = self._transaction(self._pop_locked, ns, str(key))
+        if row is None or row[1] <= time.time():
+            return None
+        return pickle.loads(row[0])
+
+    def _pop_locked(self, ns, key):
+        row = self._conn.execute(
+            "SELECT value, expires_at FROM kv WHERE ns = ? AND key = ?", (ns, key),
+        ).fetchone()
+        if row is not None:
+            self._conn.execute("DELETE FROM kv WHERE ns = ? AND key = ?", (ns, key))
+        return row
+
+    def _sweep(self):
+        with self._lock:
+            return self._conn.execute("DELETE FROM kv WHERE expires_at <= ?", (time.time(),)).rowcount
+
+    def _stats(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT ns, n FROM kv_count WHERE n > 0").fetchall()
+            evictions = dict(self._evictions)
+        return {ns: {"size": n, "evictions": evictions.get(ns, 0)} for ns, n in rows}
+
+    async def get(self, namespace, key, default=None):
+        val = await asyncio.to_thread(self._get, namespace, key)
+        return default if val is None else val
+
+    async def set(self, namespace, key, value, ttl=None):
+        await asyncio.to_thread(self._set, namespace, key, value, ttl)
+
+    async def pop(self, namespace, key, default=None):
+        val = await asyncio.to_thread(self._pop, namespace, key)
+        return default if val is None else val
+
+    async def sweep(self):
+        return await asyncio.to_thread(self._sweep)
+
+    async def stats(self):
+        return await asyncio.to_thread(self._stats)
+
+    async def close(self):
+        def _close():
+            with self._lock:
+                self._conn.close()
+        await asyncio.to_thread(_close)
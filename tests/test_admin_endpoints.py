@@ -0,0 +1,38 @@
+# tests/test_admin_endpoints.py
+"""管理接口（/__loop、/__profile）：未设置 ADMIN_TOKEN 时 404，令牌错误 403"""
+import asyncio
+
+import httpx
+import pytest
+
+import main
+
+
+def _get(path: str, headers: dict | None = None) -> httpx.Response:
+    async def go():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get(path, headers=headers)
+    return asyncio.run(go())
+
+
+@pytest.mark.parametrize("path", ["/__loop", "/__profile?seconds=0.01"])
+def test_disabled_without_token(monkeypatch, path):
+    monkeypatch.setattr(main, "ADMIN_TOKEN", None)
+    assert _get(path).status_code == 404
+    assert _get(path, {"Authorization": "Bearer anything"}).status_code == 404
+
+
+@pytest.mark.parametrize("path", ["/__loop", "/__profile?seconds=0.01"])
+def test_wrong_token(monkeypatch, path):
+    monkeypatch.setattr(main, "ADMIN_TOKEN", "s3cret")
+    assert _get(path).status_code == 403
+    assert _get(path, {"Authorization": "Bearer nope"}).status_code == 403
+
+
+def test_loop_with_token(monkeypatch):
+    monkeypatch.setattr(main, "ADMIN_TOKEN", "s3cret")
+    r = _get("/__loop", {"Authorization": "Bearer s3cret"})
+    assert r.status_code == 200
+    assert "recent" in r.json()
+    assert _get("/__loop", {"X-Admin-Token": "s3cret"}).status_code == 200
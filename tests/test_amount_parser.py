@@ -0,0 +1,207 @@
+# tests/test_amount_parser.py
+"""
+amount_parser 与旧实现（bench.run.legacy_parse_amount_any）的对照：
+纯数字 / 阿拉伯数字 + 单位链逐项一致；N -> 中文数字 -> N 往返；后缀缩放；已知回归用例。
+随机用例固定种子，失败可复现。
+"""
+import random
+from decimal import Decimal, ROUND_HALF_UP
+
+import pytest
+
+import main
+from amount_parser import parse_amount, parse_amounts
+from bench.run import legacy_parse_amount_any
+
+N_CASES = 20000
+_Q4 = Decimal("0.0001")
+_CN = "零一二三四五六七八九"
+
+
+def _cn_section(n: int, leading_zero: bool) -> str:
+    """0 < n < 10000 -> 中文（十位为一且无前导时省略“一”：十五）"""
+    out, zero, started = "", False, False
+    for unit, p in (("千", 1000), ("百", 100), ("十", 10), ("", 1)):
+        d = n // p % 10
+        if d == 0:
+            zero = zero or started or leading_zero
+            continue
+        if zero:
+            out += "零"
+        zero = False
+        omit_one = unit == "十" and d == 1 and not started and not leading_zero
+        out += ("" if omit_one else _CN[d]) + unit
+        started = True
+    return out
+
+
+def to_chinese(n: int) -> str:
+    """1 <= n <= 1e9 的中文读法：一亿二千万 / 十万零五 / 五十万"""
+    yi, wan, rest = n // 10 ** 8, n // 10 ** 4 % 10 ** 4, n % 10 ** 4
+    out = ""
+    if yi:
+        out += _cn_section(yi, False) + "亿"
+    if wan:
+        out += _cn_section(wan, bool(yi) and wan < 1000) + "万"
+    elif yi and rest:
+        out += "零"
+    if rest:
+        if (yi or wan) and rest < 1000 and not out.endswith("零"):
+            out += "零"
+        out += _cn_section(rest, False)
+    return out
+
+
+def test_chinese_helper():
+    assert to_chinese(500000) == "五十万"
+    assert to_chinese(120000000) == "一亿二千万"
+    assert to_chinese(100005) == "十万零五"
+    assert to_chinese(105000000) == "一亿零五百万"
+
+
+def test_arabic_parity_with_legacy():
+    rnd = random.Random(20261015)
+    for _ in range(N_CASES):
+        n = rnd.randint(1, 10 ** 9)
+        text = f"{n:,}" if rnd.random() < 0.3 else str(n)
+        if rnd.random() < 0.3:
+            text += "." + str(rnd.randint(0, 9999)).zfill(rnd.randint(1, 4))
+        assert parse_amount(text) == legacy_parse_amount_any(text), text
+        assert main._parse_amount_any(text) == legacy_parse_amount_any(text), text
+
+
+def test_unit_chain_parity_with_legacy():
+    rnd = random.Random(7)
+    checked = 0
+    while checked < N_CASES:
+        parts = []
+        if rnd.random() < 0.3:
+            parts.append(f"{rnd.randint(1, 9)}亿")
+        if rnd.random() < 0.6:
+            parts.append(f"{rnd.choice([rnd.randint(1, 9999), round(rnd.uniform(0.1, 999), rnd.randint(1, 3))])}万")
+        for unit in "千百十":
+            if rnd.random() < 0.5:
+                parts.append(f"{rnd.randint(1, 9)}{unit}")
+        if rnd.random() < 0.5:
+            parts.append(str(rnd.randint(1, 9)))
+        text = "".join(parts)
+        if not text:
+            continue
+        if rnd.random() < 0.3:
+            text += rnd.choice(["美金", "美元", " USD", "块"])
+        assert parse_amount(text) == legacy_parse_amount_any(text), text
+        checked += 1
+
+
+def test_chinese_numeral_round_trip():
+    rnd = random.Random(42)
+    for _ in range(N_CASES):
+        n = rnd.randint(1, 10 ** 9)
+        assert parse_amount(to_chinese(n)) == n, to_chinese(n)
+    for n in (*range(1, 200), 1000, 1005, 1050, 10000, 10005, 100000, 10 ** 8, 10 ** 9):
+        assert parse_amount(to_chinese(n)) == n, to_chinese(n)
+
+
+def test_suffix_scaling():
+    rnd = random.Random(3)
+    scales = {"k": 10 ** 3, "K": 10 ** 3, "w": 10 ** 4, "W": 10 ** 4, "m": 10 ** 6, "M": 10 ** 6}
+    for _ in range(N_CASES):
+        x = Decimal(rnd.randint(1, 99999)) / Decimal(rnd.choice([1, 10, 100, 1000]))
+        suffix = rnd.choice(list(scales))
+        expected = (x * scales[suffix]).quantize(_Q4, rounding=ROUND_HALF_UP)
+        text = rnd.choice(["", "$", "US$"]) + f"{x}{suffix}"
+        assert parse_amount(text) == (expected if 0 < expected <= 10 ** 9 else None), text
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("五十万", 500000), ("一亿二千万", 120000000), ("一万五", 15000), ("三千五", 3500),
+    ("三点五万", 35000), ("壹仟零伍拾", 1050), ("５０万", 500000), ("1万2千3百50", 12350),
+    ("$5m", 5000000), ("1.2k", 1200), ("十万", 100000),
+    ("-5", None), ("1.2.3", None), ("abc", None), ("", None),
+])
+def test_known_cases(text, expected):
+    assert parse_amount(text) == (None if expected is None else Decimal(expected))
+
+
+def test_regression_exponent_is_not_concatenated():
+    # 1e5 曾被拼成 15：解析器拒绝，入口先走 Decimal，与 /convert 一致
+    assert parse_amount("1e5") is None
+    assert parse_amount("1x5") is None
+    assert main._parse_amount_any("1e5") == Decimal("100000")
+    assert main._parse_amount_any("1e5") == main._parse_amount_to_decimal("1e5")
+
+
+def test_regression_bare_unit():
+    assert parse_amount("万") is None
+    assert parse_amount("亿") is None
+    assert main._parse_amount_any("万") is None
+
+
+def test_regression_detached_suffix():
+    # 与数字隔开的 m 不是后缀（如“100 m”），不放大一百万倍
+    assert parse_amount("100 m") == Decimal("100")
+    assert parse_amount("100m") == Decimal("100000000")
+
+
+def test_regression_repeated_unit_is_not_summed():
+    # 1万 5万 不是一个金额：拒绝而不是静默求和为 60000
+    assert parse_amount("1万 5万") is None
+    assert parse_amount("1万5万") is None
+    assert parse_amount("1亿2亿") is None
+    assert parse_amount("1万 2千") == Decimal("12000")
+
+
+def test_regression_unit_without_digit():
+    # 前面没有数字的万 / 亿 / 百 / 千不按“一”补齐：万5 曾得 10005、千5 曾得 1005、1亿万 曾得 100010000
+    assert parse_amount("万5") is None
+    assert parse_amount("千5") is None
+    assert parse_amount("百5") is None
+    assert parse_amount("1亿万") is None
+    assert parse_amount("一万百") is None
+    # “十”可省略“一”，“零十”按一十处理
+    assert parse_amount("十五") == Decimal("15")
+    assert parse_amount("一万零十六") == Decimal("10016")
+
+
+def test_regression_nothing_after_suffix():
+    # 拉丁后缀收拢全部数值：5k万 曾得 15000、1k2k 曾得 1002000
+    assert parse_amount("5k万") is None
+    assert parse_amount("1k2k") is None
+    assert parse_amount("1k5") is None
+    assert main._parse_amount_any("5k万") is None
+    assert main._parse_amount_any("1k2k") is None
+    assert parse_amount("$5m USD") == Decimal("5000000")
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("1万, 5万, 10万", [10000, 50000, 100000]),
+    ("1万、5万；10万", [10000, 50000, 100000]),
+    ("1万 5万 10万", [10000, 50000, 100000]),
+    ("5000 10000 20000", [5000, 10000, 20000]),
+    ("1万 5万, 20万", [10000, 50000, 200000]),
+    ("1万~5万", [10000, 20000, 30000, 40000, 50000]),
+    ("1万-10万/3万", [10000, 40000, 70000, 100000]),
+    ("1万 到 3万 步长 1万", [10000, 20000, 30000]),
+    # 仍是一个金额：单位链与千分位空格
+    ("1万 2千", [12000]),
+    ("500 000", [500000]),
+    ("12,345.67", [Decimal("12345.67")]),
+    ("10000,50000", [10000, 50000]),
+    ("1万, abc", None),
+    ("5万~1万", None),
+    ("-5", None),
+])
+def test_parse_amounts(text, expected):
+    got = parse_amounts(text, main._parse_amount_any)
+    assert got == (None if expected is None else [Decimal(v) for v in expected])
+
+
+def test_parse_amounts_caps_ranges():
+    assert len(parse_amounts("1~1000000000", main._parse_amount_any, max_count=20)) == 21
+    assert parse_amounts("10000 50000", main._parse_amount_to_decimal) == [Decimal(10000), Decimal(50000)]
+
+
+def test_space_only_groups_thousands():
+    # 空格后不是三位数字时不是千分位：拒绝而不是拼成 500010000
+    assert parse_amount("5000 10000") is None
+    assert parse_amount("1 000 000") == Decimal("1000000")
@@ -0,0 +1,56 @@
+# tests/test_boc_fetch.py
+"""fetch_boc_snapshot_httpx 的条件请求：ETag 只随成功解析的快照保存；无编码声明的 GB18030 页面"""
+import asyncio
+from pathlib import Path
+
+import httpx
+import pytest
+
+import main
+
+PAGE = (Path(__file__).resolve().parent.parent / "bench" / "fixtures" / "boc_whpj.html").read_text(encoding="utf-8")
+
+
+@pytest.fixture(autouse=True)
+def fresh_page_state(monkeypatch):
+    monkeypatch.setattr(main, "_boc_page_state",
+                        {"etag": None, "last_modified": None, "body_hash": None, "snapshot": None})
+
+
+def _run(responses):
+    """按顺序返回 responses，记录每次请求携带的 If-None-Match；返回 (各次 USD 现汇卖出价, 请求头)"""
+    sent = []
+
+    def handler(request):
+        sent.append(request.headers.get("if-none-match"))
+        status, body, headers = responses[len(sent) - 1]
+        return httpx.Response(status, content=body, headers=headers)
+
+    async def go():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            out = []
+            for _ in responses:
+                snapshot = await main.fetch_boc_snapshot_httpx(client)
+                out.append(None if snapshot is None else snapshot.price("USD"))
+            return out
+
+    return asyncio.run(go()), sent
+
+
+def test_failed_parse_does_not_store_etag():
+    prices, sent = _run([
+        (200, PAGE.encode(), {"ETag": '"a"', "Content-Type": "text/html; charset=utf-8"}),
+        (200, b"<html>maintenance</html>", {"ETag": '"b"'}),
+        (304, b"", {}),
+    ])
+    # 第三次仍带页面 a 的 ETag：304 表示 a 仍是最新，返回 a 的快照是正确的
+    assert sent == [None, '"a"', '"a"']
+    assert prices[1] is None
+    assert str(prices[0]) == str(prices[2]) == "714.45"
+
+
+def test_gb18030_page_without_charset():
+    page = PAGE.replace("714.45", "720.00").encode("gb18030")
+    prices, sent = _run([(200, page, {"ETag": '"c"'}), (304, b"", {})])
+    assert [str(p) for p in prices] == ["720.00", "720.00"]
+    assert sent == [None, '"c"']
@@ -0,0 +1,70 @@
+# tests/test_boc_parser.py
+"""
+parse_snapshot 黄金文件测试：
+  - bench/fixtures/boc_whpj.html：UTF-8 样例页（基准测试同一份）
+  - tests/fixtures/boc_whpj_gb18030.html：GB18030 编码、无 charset 响应头时经 main._decode_boc_page 解码
+  - tests/fixtures/boc_no_table.html：维护页，没有牌价表
+"""
+from decimal import Decimal
+from pathlib import Path
+
+import httpx
+import pytest
+
+import main
+from boc_parser import PRICE_TYPES, parse_snapshot
+
+ROOT = Path(__file__).resolve().parent.parent
+UTF8_PAGE = ROOT / "bench" / "fixtures" / "boc_whpj.html"
+GB18030_PAGE = ROOT / "tests" / "fixtures" / "boc_whpj_gb18030.html"
+NO_TABLE_PAGE = ROOT / "tests" / "fixtures" / "boc_no_table.html"
+
+
+def _prices(snapshot, code):
+    return {pt: snapshot.get(code).price(pt) for pt in PRICE_TYPES}
+
+
+def _expected(se_bid, bn_bid, se_ask, bn_ask, middle):
+    values = (se_bid, bn_bid, se_ask, bn_ask, middle)
+    return {pt: None if v is None else Decimal(v) for pt, v in zip(PRICE_TYPES, values)}
+
+
+def test_utf8_page():
+    snapshot = parse_snapshot(UTF8_PAGE.read_text(encoding="utf-8"))
+    assert snapshot is not None
+    assert snapshot.pub_time == "2026.10.01 10:30:00"
+    assert _prices(snapshot, "USD") == _expected("711.45", "705.72", "714.45", "714.45", "712.03")
+    assert _prices(snapshot, "EUR") == _expected("832.16", "806.31", "838.29", "840.99", "835.77")
+    assert _prices(snapshot, "JPY") == _expected("4.8173", "4.6677", "4.8528", "4.8603", "4.8324")
+    assert snapshot.get("USD").name == "美元"
+    assert snapshot.get("USD").pub_time == "2026.10.01 10:30:00"
+
+
+def _check_gb18030_snapshot(snapshot):
+    assert snapshot is not None
+    assert len(snapshot) == 12
+    assert snapshot.pub_time == "2026.10.15 10:29:43"
+    assert _prices(snapshot, "USD") == _expected("712.38", "706.59", "715.39", "715.39", "713.05")
+    assert _prices(snapshot, "EUR") == _expected("834.18", "808.27", "840.34", "843.05", "837.11")
+    # 只有现钞价与折算价的币种：缺失列为 None
+    assert _prices(snapshot, "BRL") == _expected(None, "126.55", None, "143.37", "131.02")
+    assert snapshot.get("EUR").name == "欧元"
+
+
+def test_gb18030_page_bytes():
+    _check_gb18030_snapshot(parse_snapshot(GB18030_PAGE.read_bytes()))
+
+
+def test_gb18030_page_decoded_like_fetch():
+    response = httpx.Response(200, content=GB18030_PAGE.read_bytes())
+    _check_gb18030_snapshot(parse_snapshot(main._decode_boc_page(response)))
+
+
+@pytest.mark.parametrize("page", [
+    NO_TABLE_PAGE.read_text(encoding="utf-8"),
+    "",
+    b"",
+    "<html><body><table><tr><th>货币名称</th><th>发布时间</th></tr></table></body></html>",
+])
+def test_no_rate_table(page):
+    assert parse_snapshot(page) is None
@@ -0,0 +1,107 @@
+# tests/test_chat_scheduler.py
+"""ChatScheduler：同一 key 按提交顺序执行（含处理失败时），不同 key 并发且不超过 max_concurrency，计数与取消"""
+import asyncio
+import random
+
+from chat_scheduler import ChatScheduler
+
+
+def test_fifo_per_key_with_failures():
+    async def go():
+        done = {}
+        rnd = random.Random(11)
+
+        async def handler(item):
+            key, seq = item
+            await asyncio.sleep(rnd.random() / 1000)
+            done.setdefault(key, []).append(seq)
+            if seq % 3 == 0:
+                raise RuntimeError("boom")
+
+        sched = ChatScheduler(handler, max_concurrency=4)
+        for seq in range(30):
+            for key in range(5):
+                sched.submit(key, (key, seq))
+        await sched.join()
+        assert done == {key: list(range(30)) for key in range(5)}
+        assert sched.stats == {"submitted": 150, "processed": 100, "failed": 50}
+        assert sched.pending == 0 and sched.active_chats == 0
+    asyncio.run(go())
+
+
+def test_concurrency_capped_across_keys():
+    async def go():
+        running = peak = 0
+        per_key = {}
+
+        async def handler(key):
+            nonlocal running, peak
+            running += 1
+            per_key[key] = per_key.get(key, 0) + 1
+            peak = max(peak, running)
+            assert per_key[key] == 1  # 同一 key 不会并发
+            await asyncio.sleep(0.001)
+            per_key[key] -= 1
+            running -= 1
+
+        sched = ChatScheduler(handler, max_concurrency=3)
+        for _ in range(5):
+            for key in range(10):
+                sched.submit(key, key)
+        await sched.join()
+        assert peak == 3
+    asyncio.run(go())
+
+
+def test_pending_accounting_and_join():
+    async def go():
+        gates = {key: asyncio.Event() for key in "ab"}
+
+        async def handler(item):
+            await gates[item[0]].wait()
+
+        sched = ChatScheduler(handler, max_concurrency=2)
+        assert sched.pending == 0 and not sched.has_pending("a")
+        await sched.join()  # 空闲时立即返回
+        for item in ("a1", "a2", "b1"):
+            sched.submit(item[0], item)
+        assert sched.pending == 3 and sched.active_chats == 2
+        assert sched.has_pending("a") and sched.has_pending("b") and not sched.has_pending("c")
+
+        joined = asyncio.create_task(sched.join())
+        gates["b"].set()
+        for _ in range(5):
+            await asyncio.sleep(0)
+        assert sched.pending == 2 and not sched.has_pending("b") and sched.has_pending("a")
+        assert not joined.done()
+        gates["a"].set()
+        await asyncio.wait_for(joined, 1)
+        assert sched.pending == 0 and sched.active_chats == 0
+    asyncio.run(go())
+
+
+def test_close_cancels_remaining_chains():
+    async def go():
+        started, cancelled = [], []
+        release = asyncio.Event()
+
+        async def handler(item):
+            started.append(item)
+            try:
+                await release.wait()
+            except asyncio.CancelledError:
+                cancelled.append(item)
+                raise
+
+        sched = ChatScheduler(handler, max_concurrency=1)
+        for item in ("a1", "a2", "a3", "b1", "b2"):
+            sched.submit(item[0], item)
+        await asyncio.sleep(0.01)
+        assert started == ["a1"]  # b1 在等信号量，a2/a3 在链上排队
+        await sched.close()
+        assert cancelled == ["a1"]
+        assert started == ["a1"]  # 剩余任务被丢弃，不再执行
+        assert sched.pending == 0 and sched.active_chats == 0
+        await asyncio.wait_for(sched.join(), 1)
+        assert sched.stats["processed"] == 0
+    asyncio.run(go())
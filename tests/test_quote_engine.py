@@ -0,0 +1,78 @@
+# tests/test_quote_engine.py
+"""
+quote_engine 与原 Decimal 实现（bench.run.legacy_compute_quote）逐项对照。
+默认 20 万组随机输入（固定种子）；发布前可用 QUOTE_TEST_CASES=5000000 跑更大规模。
+"""
+import os
+import random
+from decimal import Decimal
+
+import pytest
+
+import main
+from bench.run import legacy_compute_quote
+from quote_engine import fmt_units, quote_batch, quote_ratios, quote_units, to_decimal
+
+N_CASES = int(os.environ.get("QUOTE_TEST_CASES", "200000"))
+
+
+def _rand_decimal(rnd: random.Random, lo: int, hi: int, places: int) -> Decimal:
+    return Decimal(rnd.randint(lo * 10 ** places, hi * 10 ** places)).scaleb(-places)
+
+
+def _random_inputs(seed: int, n: int):
+    """金额至 1e9（0-6 位小数）、牌价 2 / 4 / 6 位小数（含日元量级）、费率 0-100%（至多 6 位小数）"""
+    rnd = random.Random(seed)
+    produced = 0
+    while produced < n:
+        amount = _rand_decimal(rnd, 0, 10 ** 9, rnd.choice([0, 0, 0, 1, 2, 4, 6]))
+        per_unit = _rand_decimal(rnd, 0, rnd.choice([1, 20, 2000]), rnd.choice([2, 4, 4, 6]))
+        fee_pct = _rand_decimal(rnd, 0, 100, rnd.choice([0, 1, 1, 2, 3, 6]))
+        if amount <= 0 or per_unit <= 0:
+            continue
+        produced += 1
+        yield amount, per_unit, fee_pct
+
+
+def _legacy_str(amount, per_unit, fee_pct):
+    return tuple(str(v) for v in legacy_compute_quote(amount, per_unit, fee_pct))
+
+
+def test_matches_decimal_path_randomized():
+    mismatches = []
+    for amount, per_unit, fee_pct in _random_inputs(20261015, N_CASES):
+        got = tuple(str(to_decimal(v)) for v in quote_units(amount, per_unit, fee_pct))
+        if got != _legacy_str(amount, per_unit, fee_pct):
+            mismatches.append((amount, per_unit, fee_pct))
+    assert not mismatches, mismatches[:5]
+
+
+@pytest.mark.parametrize("amount, per_unit, fee_pct", [
+    ("500000", "7.1445", "2.3"),
+    ("12345.67", "7.1445", "0"),
+    ("1000000000", "7.1445", "100"),
+    ("0.0001", "0.048528", "0.5"),
+    ("1", "0.01", "0.000001"),
+    ("999999999.999999", "1999.999999", "99.999999"),
+])
+def test_matches_decimal_path_edges(amount, per_unit, fee_pct):
+    args = Decimal(amount), Decimal(per_unit), Decimal(fee_pct)
+    assert tuple(str(to_decimal(v)) for v in quote_units(*args)) == _legacy_str(*args)
+
+
+def test_batch_and_ratios_match_single():
+    cases = list(_random_inputs(7, 200))
+    per_unit, fee_pct = cases[0][1], cases[0][2]
+    amounts = [a for a, _, _ in cases]
+    expected = [quote_units(a, per_unit, fee_pct) for a in amounts]
+    assert quote_batch(amounts, per_unit, fee_pct) == expected
+    p, f = per_unit.as_integer_ratio(), fee_pct.as_integer_ratio()
+    assert [quote_ratios(a.as_integer_ratio(), p, f) for a in amounts] == expected
+
+
+def test_fmt_units_matches_fmt_money():
+    rnd = random.Random(99)
+    values = [0, 1, 9999, 10000, 12345678, 10 ** 13, 10 ** 13 + 1]
+    values += [rnd.randint(0, 10 ** rnd.randint(1, 16)) for _ in range(50000)]
+    for units in values:
+        assert fmt_units(units) == main._fmt_money(to_decimal(units)), units
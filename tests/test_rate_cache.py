@@ -0,0 +1,94 @@
+# tests/test_rate_cache.py
+"""get_usd_per_usd_with_cache 单飞：N 个并发未命中只抓取一次上游（originating 1 / coalesced N-1）"""
+import asyncio
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+
+import httpx
+import pytest
+
+import main
+
+PAGE = (Path(__file__).resolve().parent.parent / "bench" / "fixtures" / "boc_whpj.html").read_bytes()
+N = 50
+
+
+@pytest.fixture(autouse=True)
+def fresh_rate_state(monkeypatch):
+    monkeypatch.setattr(main, "_rate_cache",
+                        {"per_usd": None, "pub_time": None, "cached_at": None, "raw_100": None, "snapshot": None})
+    monkeypatch.setattr(main, "_rate_fetch_stats", {k: 0 for k in main._rate_fetch_stats})
+    monkeypatch.setattr(main, "_rate_inflight", {})
+    monkeypatch.setattr(main, "_boc_page_state",
+                        {"etag": None, "last_modified": None, "body_hash": None, "snapshot": None})
+    monkeypatch.setattr(main, "_history", None)
+    yield
+    main.set_http_client(None)
+
+
+def _upstream():
+    """慢速上游：让并发请求都在第一次抓取完成前到达；返回 (client, 请求计数)"""
+    calls = []
+
+    async def handler(request):
+        calls.append(request.url)
+        await asyncio.sleep(0.05)
+        return httpx.Response(200, content=PAGE, headers={"Content-Type": "text/html; charset=utf-8"})
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler)), calls
+
+
+def test_concurrent_misses_fetch_once():
+    async def go():
+        client, calls = _upstream()
+        main.set_http_client(client)
+        async with client:
+            results = await asyncio.gather(*(main.get_usd_per_usd_with_cache() for _ in range(N)))
+            assert len(calls) == 1
+            assert {r[2] for r in results} == {Decimal("714.45")}
+            assert main._rate_inflight == {}
+            # 之后命中缓存，不再请求上游
+            await main.get_usd_per_usd_with_cache()
+            assert len(calls) == 1
+    asyncio.run(go())
+    stats = main._rate_fetch_stats
+    assert stats["originating"] == 1
+    assert stats["coalesced"] == N - 1
+    assert stats["misses"] == N
+    assert stats["hits"] == 1
+    assert stats["bocfx_fallbacks"] == 0
+
+
+def test_concurrent_stale_reads_refresh_once():
+    async def go():
+        client, calls = _upstream()
+        main.set_http_client(client)
+        async with client:
+            main._rate_cache.update(per_usd=Decimal("7.0000"), raw_100=Decimal("700.00"), pub_time="old",
+                                    cached_at=main._now_tz() - timedelta(seconds=main.RATE_TTL + 1))
+            results = await asyncio.gather(*(main.get_usd_per_usd_with_cache() for _ in range(N)))
+            assert {r[2] for r in results} == {Decimal("700.00")}  # 先返回旧值
+            await asyncio.gather(*main._rate_inflight.values())
+            assert len(calls) == 1
+            assert main._rate_cache["raw_100"] == Decimal("714.45")
+    asyncio.run(go())
+    stats = main._rate_fetch_stats
+    assert stats["stale_served"] == N
+    assert stats["originating"] == 1
+    assert stats["coalesced"] == N - 1
+
+
+def test_cancelled_waiter_does_not_cancel_shared_fetch():
+    async def go():
+        client, calls = _upstream()
+        main.set_http_client(client)
+        async with client:
+            waiters = [asyncio.create_task(main.get_usd_per_usd_with_cache()) for _ in range(3)]
+            await asyncio.sleep(0.01)
+            waiters[0].cancel()
+            results = await asyncio.gather(*waiters, return_exceptions=True)
+            assert isinstance(results[0], asyncio.CancelledError)
+            assert [r[2] for r in results[1:]] == [Decimal("714.45")] * 2
+            assert len(calls) == 1
+    asyncio.run(go())
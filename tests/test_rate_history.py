@@ -0,0 +1,81 @@
+# tests/test_rate_history.py
+"""RateHistory：按发布时间去重、range 边界、at 早于第一条；/history 窗口解析越界时按参数非法处理"""
+import asyncio
+from datetime import datetime
+from decimal import Decimal
+
+import httpx
+import pytest
+
+import main
+from boc_parser import RateRow, RateSnapshot
+from rate_history import CN_TZ, RateHistory
+
+
+def _snapshot(pub_time: str, se_ask: str) -> RateSnapshot:
+    price = Decimal(se_ask)
+    row = RateRow("USD", "美元", price, price, price, price, price, pub_time)
+    return RateSnapshot({"USD": row}, pub_time)
+
+
+def _ts(text: str) -> datetime:
+    return datetime.strptime(text, "%Y-%m-%d %H:%M:%S").replace(tzinfo=CN_TZ)
+
+
+@pytest.fixture
+def history(tmp_path):
+    h = RateHistory(str(tmp_path / "history.sqlite3"))
+    yield h
+    h.close()
+
+
+def test_dedup_by_pub_time(history):
+    history.record(_snapshot("2026.10.01 10:00:00", "714.45"))
+    history.record(_snapshot("2026.10.01 10:00:00", "799.99"))  # 同一发布时间的新快照：忽略
+    snap = _snapshot("2026.10.01 10:30:00", "715.00")
+    history.record(snap)
+    history.record(snap)  # 同一快照对象：不重复入缓冲
+    assert history.flush() == 3
+    history.record(_snapshot("2026.10.01 10:30:00", "799.99"))
+    history.flush()
+    assert history.range("USD", _ts("2026-10-01 00:00:00")) == [
+        (_ts("2026-10-01 10:00:00"), Decimal("714.45")),
+        (_ts("2026-10-01 10:30:00"), Decimal("715.00")),
+    ]
+
+
+def test_range_bounds_are_inclusive(history):
+    for minute, price in ((0, "714.00"), (30, "714.30"), (59, "714.59")):
+        history.record(_snapshot(f"2026.10.01 10:{minute:02d}:00", price))
+    history.flush()
+    got = history.range("USD", _ts("2026-10-01 10:00:00"), _ts("2026-10-01 10:30:00"))
+    assert [p for _, p in got] == [Decimal("714.00"), Decimal("714.30")]
+    assert history.range("USD", _ts("2026-10-01 10:00:01"), _ts("2026-10-01 10:29:59")) == []
+    assert history.range("EUR", _ts("2026-10-01 00:00:00")) == []
+    with pytest.raises(ValueError):
+        history.range("USD", _ts("2026-10-01 00:00:00"), price_kind="NOPE")
+
+
+def test_at_before_first_row(history):
+    history.record(_snapshot("2026.10.01 10:00:00", "714.00"))
+    history.record(_snapshot("2026.10.01 11:00:00", "715.00"))
+    history.flush()
+    assert history.at("USD", _ts("2026-10-01 09:59:59")) is None
+    assert history.at("USD", _ts("2026-10-01 10:00:00")) == (_ts("2026-10-01 10:00:00"), Decimal("714.00"))
+    assert history.at("USD", _ts("2026-10-01 10:59:59")) == (_ts("2026-10-01 10:00:00"), Decimal("714.00"))
+    assert history.at("USD", _ts("2026-10-02 00:00:00")) == (_ts("2026-10-01 11:00:00"), Decimal("715.00"))
+
+
+@pytest.mark.parametrize("window", ["9999999d", "99999999999h", "9" * 30 + "m"])
+def test_window_out_of_range(window):
+    assert main._parse_history_window(window) is None
+
+
+def test_api_history_out_of_range_window(monkeypatch, history):
+    monkeypatch.setattr(main, "_history", history)
+
+    async def go():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/api/history", params={"window": "9999999d"})
+    assert asyncio.run(go()).status_code == 400
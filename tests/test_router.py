@@ -0,0 +1,31 @@
+# tests/test_router.py
+"""_classify_message：每条文本只对应一个处理函数，优先级同原 Handler 注册顺序"""
+import pytest
+
+import main
+
+BOT = "boc_fx_bot"
+
+
+@pytest.mark.parametrize("text, command_len, expected", [
+    ("/rate EUR", 5, ("rate", ["EUR"])),
+    ("/rate@boc_fx_bot JPY 现钞买入", 16, ("rate", ["JPY", "现钞买入"])),
+    ("/convert 1000 EUR", 8, ("convert", ["1000", "EUR"])),
+    ("/History 30d", 8, ("history", ["30d"])),
+    ("/start", 6, (None, None)),
+    ("/rate@otherbot", 14, (None, None)),
+    # “汇率”别名（含 /汇率：中文不构成 bot_command 实体）只走 alias_rate，不会落到 handle_text
+    ("汇率", 0, ("rate_alias", None)),
+    ("/汇率", 0, ("rate_alias", None)),
+    ("汇率 EUR", 0, ("rate_alias", None)),
+    ("兑换 50万", 0, ("convert_alias", None)),
+    ("兑换 1万, 5万", 0, ("convert_alias", None)),
+    ("2.3", 0, ("text", None)),
+    ("是", 0, ("text", None)),
+])
+def test_classify(text, command_len, expected):
+    assert main._classify_message(text, command_len, BOT) == expected
+
+
+def test_every_route_has_a_handler():
+    assert set(main.MESSAGE_ROUTES) == {*main.ROUTE_COMMANDS, "rate_alias", "convert_alias", "text"}
@@ -0,0 +1,139 @@
+# tests/test_state_backend.py
+"""StateBackend 抽象接口与两个实现的基本存取"""
+import asyncio
+
+import pytest
+
+from state_backend import MemoryBackend, SqliteBackend, StateBackend
+
+
+def test_incomplete_backend_fails_at_construction():
+    class Partial(StateBackend):
+        async def get(self, namespace, key, default=None):
+            return default
+
+    with pytest.raises(TypeError):
+        Partial()
+    with pytest.raises(TypeError):
+        StateBackend()
+
+
+@pytest.mark.parametrize("make", [
+    lambda tmp_path: MemoryBackend({"pending_fee": (10, 60)}),
+    lambda tmp_path: SqliteBackend(str(tmp_path / "state.sqlite3")),
+])
+def test_get_set_pop(tmp_path, make):
+    async def go():
+        backend = make(tmp_path)
+        try:
+            assert await backend.get("pending_fee", 1) is None
+            await backend.set("pending_fee", 1, {"amount": 5})
+            assert await backend.get("pending_fee", 1) == {"amount": 5}
+            assert await backend.pop("pending_fee", 1) == {"amount": 5}
+            assert await backend.pop("pending_fee", 1, "gone") == "gone"
+        finally:
+            await backend.close()
+    asyncio.run(go())
+
+
+class _Clock:
+    """替换 state_backend.time：SqliteBackend 的过期时间用墙钟"""
+
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+def test_sqlite_expiry(tmp_path, monkeypatch):
+    import state_backend
+    clock = _Clock()
+    monkeypatch.setattr(state_backend, "time", clock)
+
+    async def go():
+        backend = SqliteBackend(str(tmp_path / "state.sqlite3"), {"pending_fee": (10, 60)})
+        try:
+            await backend.set("pending_fee", 1, "a")
+            await backend.set("pending_fee", 2, "b", ttl=5)
+            await backend.set("pending_fee", 3, "c")
+            clock.now += 5
+            assert await backend.get("pending_fee", 2) is None  # 到期即不可读
+            assert await backend.get("pending_fee", 1) == "a"
+            clock.now += 55
+            assert await backend.pop("pending_fee", 3, "gone") == "gone"
+            assert await backend.sweep() == 2  # 1 与 2；3 已被 pop 删除
+            assert await backend.stats() == {}
+        finally:
+            await backend.close()
+    asyncio.run(go())
+
+
+def test_sqlite_capacity_evicts_earliest_expiry(tmp_path, monkeypatch):
+    import state_backend
+    clock = _Clock()
+    monkeypatch.setattr(state_backend, "time", clock)
+
+    async def go():
+        backend = SqliteBackend(str(tmp_path / "state.sqlite3"),
+                                {"last_fee_mem": (3, 100), "pending_fee": (10, 60)})
+        try:
+            for key in range(3):
+                await backend.set("last_fee_mem", key, key)
+                clock.now += 1
+            await backend.set("last_fee_mem", 0, "refreshed")  # 覆盖：续期，不计入超容
+            await backend.set("pending_fee", 99, "other")       # 其他命名空间不受影响
+            clock.now += 1
+            await backend.set("last_fee_mem", 3, 3)
+            assert await backend.get("last_fee_mem", 1) is None  # 最早过期的被删除
+            assert [await backend.get("last_fee_mem", k) for k in (0, 2, 3)] == ["refreshed", 2, 3]
+            await backend.set("last_fee_mem", 4, 4, ttl=1000)
+            await backend.set("last_fee_mem", 5, 5, ttl=1000)
+            assert [await backend.get("last_fee_mem", k) for k in (0, 2, 3)] == [None, None, 3]
+            stats = await backend.stats()
+            assert stats["last_fee_mem"] == {"size": 3, "evictions": 3}
+            assert stats["pending_fee"] == {"size": 1, "evictions": 0}
+        finally:
+            await backend.close()
+    asyncio.run(go())
+
+
+def test_sqlite_capacity_shared_between_connections(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+
+    async def go():
+        a = SqliteBackend(path, {"pending_fee": (2, 60)})
+        b = SqliteBackend(path, {"pending_fee": (2, 60)})
+        try:
+            await a.set("pending_fee", 1, "a1")
+            await b.set("pending_fee", 2, "b2")
+            await a.set("pending_fee", 3, "a3")
+            assert (await b.stats())["pending_fee"]["size"] == 2
+        finally:
+            await a.close()
+            await b.close()
+    asyncio.run(go())
+
+
+def test_sqlite_counts_track_rows(tmp_path):
+    # 行数由触发器维护：覆盖、pop、sweep、超容删除之后都应与 COUNT(*) 一致；旧库首次打开时按现有数据初始化
+    import sqlite3
+    path = str(tmp_path / "state.sqlite3")
+    with sqlite3.connect(path) as conn:
+        conn.executescript(SqliteBackend._SCHEMA)
+        conn.execute("INSERT INTO kv VALUES ('pending_fee', '7', x'80044e2e', 1e12)")
+
+    async def go():
+        backend = SqliteBackend(path, {"pending_fee": (5, 60)})
+        try:
+            for key in range(8):
+                await backend.set("pending_fee", key % 6, key)
+            await backend.set("pending_fee", 100, "expired", ttl=-1)
+            await backend.pop("pending_fee", 3)
+            await backend.sweep()
+            counted = backend._conn.execute("SELECT ns, COUNT(*) FROM kv GROUP BY ns").fetchall()
+            stats = await backend.stats()
+            assert {ns: s["size"] for ns, s in stats.items()} == dict(counted)
+        finally:
+            await backend.close()
+    asyncio.run(go())
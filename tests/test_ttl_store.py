@@ -0,0 +1,107 @@
+# tests/test_ttl_store.py
+"""TTLStore：LRU 淘汰顺序、get / pop 惰性过期、sweep 跳过被覆盖的键、堆压缩；时间由注入的 clock 控制"""
+import asyncio
+
+import httpx
+import pytest
+
+import main
+from ttl_store import TTLStore
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def test_capacity_must_be_positive():
+    with pytest.raises(ValueError):
+        TTLStore(0, 10)
+
+
+def test_lru_eviction_order(clock):
+    st = TTLStore(3, 100, clock=clock)
+    for key in "abc":
+        st[key] = key
+    assert st.get("a") == "a"  # 读取刷新 a：最久未访问的变成 b
+    st.set("c", "c2")          # 覆盖刷新 c
+    st["d"] = "d"
+    assert "b" not in st
+    st["e"] = "e"              # 接下来淘汰 a
+    assert [k for k in "acde" if k in st] == ["c", "d", "e"]
+    assert len(st) == 3
+    assert st.stats == {"evictions": 2, "expirations": 0}
+
+
+def test_lazy_expiry_on_get_and_pop(clock):
+    st = TTLStore(10, 10, clock=clock)
+    st["a"] = 1
+    st["b"] = 2
+    st.set("c", 3, ttl=100)
+    clock.now = 9.999
+    assert st.get("a") == 1
+    clock.now = 10
+    assert st.get("a", "gone") == "gone"   # 到期时刻即过期
+    assert st.pop("b", "gone") == "gone"
+    assert st.pop("c") == 3
+    assert st.pop("c", "gone") == "gone"   # 已删除：不计过期
+    assert len(st) == 0
+    assert st.stats == {"evictions": 0, "expirations": 2}
+
+
+def test_sweep_skips_overwritten_keys(clock):
+    st = TTLStore(10, 10, clock=clock)
+    st["a"] = 1
+    st["b"] = 2
+    st["c"] = 3
+    clock.now = 5
+    st["a"] = "renewed"      # 新过期时间 15，旧堆条目（10）应被跳过
+    st.pop("c")              # 已删除的键同样跳过
+    clock.now = 10
+    assert st.sweep() == 1   # 只有 b
+    assert st.get("a") == "renewed"
+    assert st.sweep() == 0
+    clock.now = 15
+    assert st.sweep() == 1
+    assert len(st) == 0
+    assert st.stats["expirations"] == 2
+
+
+def test_compact_bounds_heap(clock):
+    st = TTLStore(4, 10, clock=clock)
+    for i in range(1000):
+        st[i % 4] = i        # 反复覆盖同几个键：堆条目不应无限增长
+    assert len(st._heap) <= 2 * len(st) + 64
+    clock.now = 10
+    assert st.sweep() == 4
+    assert st._heap == []
+
+
+def test_state_metrics_exported(monkeypatch, clock):
+    backend = main.MemoryBackend({"pending_fee": (2, 10), "last_fee_mem": (5, 10)})
+    monkeypatch.setattr(main, "_state", backend)
+    pending = backend.store("pending_fee")
+    pending._clock = clock
+    for key in range(3):
+        pending[key] = key
+    clock.now = 10
+    assert pending.sweep() == 2
+
+    async def go():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/metrics")
+    body = asyncio.run(go()).text
+    assert "# TYPE bocbot_state_entries gauge" in body
+    assert 'bocbot_state_entries{namespace="pending_fee"} 0' in body
+    assert 'bocbot_state_evictions_total{namespace="pending_fee"} 1' in body
+    assert 'bocbot_state_expirations_total{namespace="pending_fee"} 2' in body
+    assert 'bocbot_state_evictions_total{namespace="last_fee_mem"} 0' in body
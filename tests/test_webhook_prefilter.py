@@ -0,0 +1,59 @@
+# tests/test_webhook_prefilter.py
+"""_prefilter_reason：基于原始 JSON 的预过滤；畸形载荷不抛异常"""
+import asyncio
+
+import httpx
+import pytest
+
+import main
+from bench.fakes import make_update
+from chat_scheduler import ChatScheduler
+
+
+@pytest.fixture(autouse=True)
+def idle_scheduler(monkeypatch):
+    async def noop(key, update):
+        pass
+    monkeypatch.setattr(main, "_scheduler", ChatScheduler(noop, max_concurrency=1))
+
+
+def _reason(data):
+    return asyncio.run(main._prefilter_reason(data))
+
+
+@pytest.mark.parametrize("data", [
+    None, [], "x", {}, {"message": None}, {"message": "hi"}, {"edited_message": {}},
+    {"message": {"text": "/rate"}},
+    {"message": {"text": "/rate", "chat": "oops"}},
+    {"message": {"text": "/rate", "chat": ["x"]}},
+    {"message": {"text": "/rate", "chat": {}}},
+    {"message": {"text": "/rate", "chat": {"id": [1]}}},
+])
+def test_malformed_payloads(data):
+    assert _reason(data) == "not_message"
+
+
+def test_no_text():
+    update = make_update(1, 42, "x")
+    del update["message"]["text"]
+    assert _reason(update) == "no_text"
+    assert _reason(make_update(2, 42, "   ")) == "no_text"
+
+
+@pytest.mark.parametrize("text", ["/rate", "/convert 1000", "/rate@boc_fx_bot EUR", "汇率 EUR", "兑换 50万"])
+def test_commands_and_aliases_pass(text):
+    assert _reason(make_update(1, 42, text)) is None
+
+
+def test_idle_chatter_dropped():
+    assert _reason(make_update(1, 424242, "今天吃什么")) == "idle_chat"
+
+
+def test_webhook_answers_200_for_bad_chat(monkeypatch):
+    monkeypatch.setattr(main, "TOKEN", "123:TEST")
+
+    async def go():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/webhook/123:TEST", json={"update_id": 1, "message": {"text": "hi", "chat": "x"}})
+    assert asyncio.run(go()).status_code == 200
@@ -0,0 +1,89 @@
+# ttl_store.py
+"""
+有界会话状态：TTL + LRU。
+
+- 容量满时淘汰最久未访问的键（evictions）
+- 每个键带过期时间；读取时惰性检查，sweep() 借助最小堆批量清理（expirations）
+"""
+import heapq
+import itertools
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLStore:
+    """dict 风格的 TTL+LRU 存储；单线程（事件循环内）使用"""
+
+    def __init__(self, capacity: int, ttl: float, clock=time.monotonic):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self.ttl = ttl
+        self._clock = clock
+        self._data = OrderedDict()   # key -> (value, deadline)
+        self._heap = []              # (deadline, seq, key)，过期/被覆盖的条目惰性丢弃
+        self._seq = itertools.count()
+        self.stats = {"evictions": 0, "expirations": 0}
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __setitem__(self, key, value) -> None:
+        self.set(key, value)
+
+    def set(self, key, value, ttl: float | None = None) -> None:
+        deadline = self._clock() + (self.ttl if ttl is None else ttl)
+        self._data[key] = (value, deadline)
+        self._data.move_to_end(key)
+        heapq.heappush(self._heap, (deadline, next(self._seq), key))
+        while len(self._data) > self.capacity:
+            self._data.popitem(last=False)
+            self.stats["evictions"] += 1
+        if len(self._heap) > 2 * len(self._data) + 64:
+            self._compact()
+
+    def get(self, key, default=None):
+        item = self._data.get(key)
+        if item is None:
+            return default
+        value, deadline = item
+        if deadline <= self._clock():
+            del self._data[key]
+            self.stats["expirations"] += 1
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def pop(self, key, default=None):
+        item = self._data.pop(key, None)
+        if item is None:
+            return default
+        value, deadline = item
+        if deadline <= self._clock():
+            self.stats["expirations"] += 1
+            return default
+        return value
+
+    def sweep(self) -> int:
+        """清理所有已过期的键，返回清理数量"""
+        now = self._clock()
+        removed = 0
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            deadline, _, key = heapq.heappop(heap)
+            item = self._data.get(key)
+            # 键已被删除或被重新设置（deadline 不同）时跳过
+            if item is not None and item[1] == deadline:
+                del self._data[key]
+                removed += 1
+        self.stats["expirations"] += removed
+        return removed
+
+    def _compact(self) -> None:
+        self._heap = [(deadline, next(self._seq), key) for key, (_, deadline) in self._data.items()]
+        heapq.heapify(self._heap)